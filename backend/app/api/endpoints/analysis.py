@@ -4,7 +4,7 @@ from app.services.azure_di import azure_di_service
 from app.services.blob_storage import get_container_client, generate_sas_url
 from app.core.firebase_admin import verify_id_token
 from app.services.status_manager import status_manager
-from app.services.blob_monitor import _count_pdf_pages
+from app.services.blob_monitor import _count_blob_pdf_pages
 from azure.storage.blob import generate_blob_sas, BlobSasPermissions
 from app.core.config import settings
 from datetime import datetime, timedelta
@@ -44,7 +44,7 @@ async def analyze_local_file(
         # 2. Trigger DI Analysis (Direct Bytes)
         # Using bytes avoids complex SAS/URL logic and ensures analysis works even if blob is private
         print(f"Analyzing document (Direct Bytes Mode)...")
-        analysis_result = azure_di_service.analyze_document_from_bytes(file_content)
+        analysis_result = await azure_di_service.analyze_document_from_bytes_async(file_content)
         
         # 3. Save result to Azure Blob (json folder)
         json_blob_client = container_client.get_blob_client(json_blob_name)
@@ -222,7 +222,7 @@ async def analyze_document_sync(
             # Use analyze_via_rendering DIRECTLY to ensure stability
             # This bypasses Azure DI's internal limits by sending optimized images
             try:
-                chunks = doc_intel_service.analyze_via_rendering(
+                chunks = await doc_intel_service.analyze_via_rendering_async(
                     blob_url=blob_url,
                     page_range=page_range,
                     dpi=150,
@@ -478,9 +478,7 @@ async def start_robust_analysis_task(
             blob_size = blob_client.get_blob_properties().size
             if blob_size < 50 * 1024 * 1024:  # Only download for PDFs < 50MB
                 try:
-                    pdf_data = blob_client.download_blob().readall()
-                    detected_pages = _count_pdf_pages(pdf_data)
-                    del pdf_data
+                    detected_pages = await asyncio.to_thread(_count_blob_pdf_pages, blob_client)
                     if detected_pages > 0:
                         print(f"[StartAnalysis] Auto-detected {detected_pages} pages (frontend sent {total_pages})")
                         total_pages = detected_pages
@@ -829,9 +827,7 @@ async def reindex_document(
                 found_blob = container_client.get_blob_client(found_path)
                 blob_size = found_blob.get_blob_properties().size
                 if blob_size < 50 * 1024 * 1024:
-                    pdf_data = found_blob.download_blob().readall()
-                    detected_pages = _count_pdf_pages(pdf_data)
-                    del pdf_data
+                    detected_pages = await asyncio.to_thread(_count_blob_pdf_pages, found_blob)
                     if detected_pages > 0:
                         print(f"[Reindex] Auto-detected {detected_pages} pages (frontend sent {total_pages})")
                         total_pages = detected_pages
@@ -943,7 +939,7 @@ async def analyze_chunk(
         
         # 2. Run DI on range
         # Note: azure_di_service.analyze_document_from_url now supports 'pages'
-        partial_result = azure_di_service.analyze_document_from_url(blob_url, pages=pages)
+        partial_result = await azure_di_service.analyze_document_from_url_async(blob_url, pages=pages)
         
         # 3. Save Partial Result to Blob
         # temp/json/{filename}_part_{pages}.json
@@ -1147,7 +1143,7 @@ async def detect_document_robust(
         doc_service = get_doc_intel_service()
         
         # Delegate to the robust rendering method
-        chunks = doc_service.analyze_via_rendering(
+        chunks = await doc_service.analyze_via_rendering_async(
             blob_url=pdf_url,
             page_range=page_range,
             dpi=dpi,
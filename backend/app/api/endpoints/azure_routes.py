@@ -362,6 +362,26 @@ def cleanup_index(req: CleanupIndexRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Prefixes once written by the removed Document Intelligence result cache.
+# Nothing writes them any more; the daily cleanup drains what is left.
+STALE_DI_PREFIXES = ("temp/di_cache/", "temp/di_lro/")
+
+
+def _sweep_stale_di_blobs() -> int:
+    container_client = get_container_client()
+    removed = 0
+    for prefix in STALE_DI_PREFIXES:
+        for blob in container_client.list_blobs(name_starts_with=prefix):
+            try:
+                container_client.delete_blob(blob.name)
+                removed += 1
+            except ResourceNotFoundError:
+                pass
+    if removed:
+        print(f"[cleanup-all-users] Removed {removed} stale DI cache blobs", flush=True)
+    return removed
+
+
 @router.post("/cleanup-all-users")
 def cleanup_all_users(x_cron_secret: str = Header(None)):
     """
@@ -375,6 +395,7 @@ def cleanup_all_users(x_cron_secret: str = Header(None)):
         print("[cleanup-all-users] Starting daily batch cleanup...", flush=True)
         result = azure_search_service.cleanup_all_users()
         print(f"[cleanup-all-users] Done: {result['users_scanned']} users scanned, {result['deleted_count']} documents removed", flush=True)
+        result["stale_blobs_removed"] = _sweep_stale_di_blobs()
         return result
     except Exception as e:
         print(f"Error in cleanup_all_users: {e}", flush=True)
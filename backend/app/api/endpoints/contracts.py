@@ -314,7 +314,7 @@ async def upload_contract(
         from app.services.azure_di import azure_di_service
         from app.services.blob_storage import generate_sas_url
         pdf_url = generate_sas_url(pdf_blob_path)
-        pages = azure_di_service.analyze_document_from_url(pdf_url)
+        pages = await azure_di_service.analyze_document_from_url_async(pdf_url)
         print(f"[Contract] DI extracted {len(pages)} pages", flush=True)
     except Exception as e:
         print(f"[Contract] DI extraction failed: {e}", flush=True)
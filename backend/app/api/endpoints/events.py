@@ -0,0 +1,59 @@
+"""
+Azure Event Grid webhook.
+
+Storage pushes Microsoft.Storage.BlobCreated events here, so new knowhow PDFs
+are picked up within seconds instead of on the next BlobMonitor poll. The
+polling loop stays as an hourly safety net for missed deliveries.
+"""
+
+import hmac
+
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query, Request
+from app.core.config import settings
+from app.services.blob_monitor import blob_monitor
+
+router = APIRouter()
+
+VALIDATION_EVENT = "Microsoft.EventGrid.SubscriptionValidationEvent"
+BLOB_CREATED_EVENT = "Microsoft.Storage.BlobCreated"
+
+
+def _blob_name_from_subject(subject: str):
+    """'/blobServices/default/containers/{container}/blobs/{name}' → name (our container only)."""
+    prefix = f"/blobServices/default/containers/{settings.AZURE_BLOB_CONTAINER_NAME}/blobs/"
+    if subject and subject.startswith(prefix):
+        return subject[len(prefix):]
+    return None
+
+
+@router.post("/blob-created")
+async def blob_created(request: Request, background_tasks: BackgroundTasks, code: str = Query(None)):
+    """
+    Event Grid delivery endpoint (Event Grid schema; events arrive as a JSON array).
+    Answers the subscription validation handshake and queues analysis for each
+    BlobCreated PDF. Protected by EVENTGRID_WEBHOOK_SECRET passed as ?code=.
+    """
+    if not settings.EVENTGRID_WEBHOOK_SECRET or not hmac.compare_digest((code or "").encode(), settings.EVENTGRID_WEBHOOK_SECRET.encode()):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    events = await request.json()
+    if isinstance(events, dict):
+        events = [events]
+
+    queued = []
+    for event in events:
+        event_type = event.get("eventType")
+        if event_type == VALIDATION_EVENT:
+            return {"validationResponse": event.get("data", {}).get("validationCode")}
+
+        if event_type != BLOB_CREATED_EVENT:
+            continue
+        blob_name = _blob_name_from_subject(event.get("subject", ""))
+        if blob_name:
+            # Respond inside Event Grid's timeout; analysis runs after the response
+            background_tasks.add_task(blob_monitor.handle_blob_created, blob_name)
+            queued.append(blob_name)
+
+    if queued:
+        print(f"[EventGrid] Queued {len(queued)} blob(s): {queued}", flush=True)
+    return {"queued": len(queued)}
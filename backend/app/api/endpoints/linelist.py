@@ -481,7 +481,7 @@ async def extract_linelist(
         # If no cached JSON, run Document Intelligence
         if not di_pages:
             sas_url = generate_sas_url(blob_path)
-            di_pages = azure_di_service.analyze_document_from_url(sas_url)
+            di_pages = await azure_di_service.analyze_document_from_url_async(sas_url)
 
             if not di_pages:
                 raise HTTPException(status_code=500, detail="Document Intelligence returned no data")
@@ -576,7 +576,7 @@ async def extract_linelist_pages(
         sas_url = generate_sas_url(blob_path)
         print(f"[LineList] Analyzing pages={pages} of {blob_path}", flush=True)
 
-        di_pages = azure_di_service.analyze_document_from_url(sas_url, pages=pages)
+        di_pages = await azure_di_service.analyze_document_from_url_async(sas_url, pages=pages)
 
         if not di_pages:
             return {"lines": [], "page_count": 0, "pid_numbers": []}
@@ -840,7 +840,7 @@ async def upload_drawing(
                     "issue_purpose": "", "issue_date": "", "vendor_drawing_number": "", "vendor_name": ""}
     try:
         from app.services.azure_di import azure_di_service
-        di_result = azure_di_service.analyze_document_from_url(pdf_url)
+        di_result = await azure_di_service.analyze_document_from_url_async(pdf_url)
         print(f"[PlantSync] DI analysis complete: {len(di_result)} pages", flush=True)
 
         # Extract title block from first page
@@ -2662,7 +2662,7 @@ async def bulk_upload_drawings(
                             "issue_purpose": "", "issue_date": "", "vendor_drawing_number": "", "vendor_name": ""}
             try:
                 from app.services.azure_di import azure_di_service
-                di_result = azure_di_service.analyze_document_from_url(pdf_url)
+                di_result = await azure_di_service.analyze_document_from_url_async(pdf_url)
                 title_block = _extract_title_block(di_result)
             except Exception as e:
                 print(f"[PlantSync] DI analysis failed for {filename}: {e}", flush=True)
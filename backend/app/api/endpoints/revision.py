@@ -212,7 +212,7 @@ async def upload_spec(
         from app.services.azure_di import azure_di_service
         from app.services.blob_storage import generate_sas_url
         spec_url = generate_sas_url(spec_blob_path)
-        di_result = azure_di_service.analyze_document_from_url(spec_url)
+        di_result = await azure_di_service.analyze_document_from_url_async(spec_url)
         extracted_text = "\n\n".join([p.get("content", "") for p in di_result])
         print(f"[Revision] DI extracted {len(extracted_text)} chars from spec", flush=True)
     except Exception as e:
@@ -347,7 +347,7 @@ async def reanalyze_spec(
         from app.services.azure_di import azure_di_service
         from app.services.blob_storage import generate_sas_url
         spec_url = generate_sas_url(spec_blob_path)
-        di_result = azure_di_service.analyze_document_from_url(spec_url)
+        di_result = await azure_di_service.analyze_document_from_url_async(spec_url)
         extracted_text = "\n\n".join([p.get("content", "") for p in di_result])
         print(f"[Revision] DI extracted {len(extracted_text)} chars from spec", flush=True)
     except Exception as e:
@@ -456,7 +456,7 @@ async def add_spec(
         from app.services.azure_di import azure_di_service
         from app.services.blob_storage import generate_sas_url
         spec_url = generate_sas_url(spec_blob_path)
-        di_result = azure_di_service.analyze_document_from_url(spec_url)
+        di_result = await azure_di_service.analyze_document_from_url_async(spec_url)
         extracted_text = "\n\n".join([p.get("content", "") for p in di_result])
         print(f"[Revision] DI extracted {len(extracted_text)} chars from additional spec", flush=True)
     except Exception as e:
@@ -885,7 +885,7 @@ async def analyze_revision_file(
         from app.services.azure_di import azure_di_service
         from app.services.blob_storage import generate_sas_url
         file_url = generate_sas_url(temp_blob_path)
-        di_result = azure_di_service.analyze_document_from_url(file_url)
+        di_result = await azure_di_service.analyze_document_from_url_async(file_url)
         extracted_text = "\n\n".join([p.get("content", "") for p in di_result])
         print(f"[Revision] DI extracted {len(extracted_text)} chars for analysis", flush=True)
     except Exception as e:
@@ -1511,7 +1511,7 @@ async def _extract_text_from_blob(blob_path: str) -> str:
         from app.services.azure_di import azure_di_service
         from app.services.blob_storage import generate_sas_url
         file_url = generate_sas_url(blob_path)
-        di_result = azure_di_service.analyze_document_from_url(file_url)
+        di_result = await azure_di_service.analyze_document_from_url_async(file_url)
         return "\n\n".join([p.get("content", "") for p in di_result])
     except Exception as e:
         print(f"[Revision] Text extraction failed for {blob_path}: {e}", flush=True)
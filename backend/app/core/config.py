@@ -34,6 +34,8 @@ class Settings(BaseSettings):
     AZURE_SEARCH_ENDPOINT: str = ""
     AZURE_SEARCH_KEY: str = ""
     AZURE_SEARCH_INDEX_NAME: str = "pdf-search-index" # Default index name
+    AZURE_SEARCH_MAX_CONCURRENT_BATCHES: int = 0  # Parallel upload batches (0 = service default of 4)
+    AZURE_SEARCH_BUFFERED_UPLOAD: bool = False  # Use SDK SearchIndexingBufferedSender instead of manual batching
 
     # KCSC (국가건설기준센터) API
     KCSC_API_KEY: str = ""
@@ -41,6 +43,9 @@ class Settings(BaseSettings):
     # Cron / Cloud Scheduler (daily batch cleanup)
     CRON_SECRET: str = ""
 
+    # Event Grid BlobCreated webhook (?code=... on the subscription URL)
+    EVENTGRID_WEBHOOK_SECRET: str = ""
+
     class Config:
         env_file = ".env"
 
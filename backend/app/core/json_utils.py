@@ -0,0 +1,28 @@
+"""
+Shared JSON encode/decode.
+
+Uses orjson when installed, with a stdlib fallback that produces the same
+compact, non-ASCII-escaped UTF-8 output.
+"""
+
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+
+    def dumps(obj) -> bytes:
+        """Compact UTF-8 JSON bytes, ready for upload_blob."""
+        return orjson.dumps(obj)
+
+    loads = orjson.loads
+except ImportError:
+    logger.warning("orjson not installed; falling back to stdlib json.")
+
+    def dumps(obj) -> bytes:
+        """Compact UTF-8 JSON bytes, ready for upload_blob."""
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+    loads = json.loads
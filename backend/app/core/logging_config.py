@@ -0,0 +1,38 @@
+"""
+Queue-based logging setup.
+
+Root handlers are moved behind a QueueListener so formatting and stream writes
+happen on one background thread; request handlers and upload/embedding worker
+threads only enqueue records.
+"""
+
+import atexit
+import logging
+import logging.handlers
+import queue
+
+_listener = None
+
+
+def setup_logging(level: int = logging.INFO):
+    """Route root logging through a QueueHandler (idempotent)."""
+    global _listener
+
+    if _listener is not None:
+        return _listener
+
+    root = logging.getLogger()
+    if not root.handlers:
+        logging.basicConfig(level=level)
+
+    handlers = root.handlers[:]
+    for handler in handlers:
+        root.removeHandler(handler)
+
+    log_queue = queue.SimpleQueue()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)  # drain queued records on shutdown
+    return _listener
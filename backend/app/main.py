@@ -1,6 +1,12 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
+from app.core.logging_config import setup_logging
+
+# Before the service imports, so their module-level basicConfig calls are no-ops
+setup_logging()
+
 from app.api.endpoints import upload, chat
 
 azure_routes_error = None
@@ -12,9 +18,17 @@ except Exception as e:
     azure_routes_error = str(e)
     print(f"Error loading azure_routes module: {e}")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Close the Document Intelligence service's pooled aiohttp sessions and render pool
+    from app.services.doc_intel_service import close_doc_intel_service
+    await close_doc_intel_service()
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
 print(f"Backend '{settings.PROJECT_NAME}' starting up...")
@@ -139,6 +153,13 @@ try:
 except Exception as e:
     print(f"Error loading plantsync module: {e}", flush=True)
 
+# Enable Event Grid Webhook Router (BlobCreated push instead of polling)
+try:
+    from app.api.endpoints import events
+    app.include_router(events.router, prefix=f"{settings.API_V1_STR}/events", tags=["events"])
+except Exception as e:
+    print(f"Error loading events module: {e}", flush=True)
+
 # Mount uploads directory to serve static files if it exists
 uploads_dir = Path("uploads")
 if not uploads_dir.exists():
@@ -1,5 +1,9 @@
+import asyncio
+import functools
 import json
 import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from azure.ai.formrecognizer import DocumentAnalysisClient
 from azure.core.credentials import AzureKeyCredential
 from azure.core.exceptions import HttpResponseError
@@ -10,6 +14,10 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class AzureDIService:
+    # Per-page formatting fan-out (only worth it for multi-page results)
+    PARALLEL_FORMAT_MIN_PAGES = 5
+    FORMAT_WORKERS = 4
+
     def __init__(self):
         self.endpoint = settings.AZURE_DOC_INTEL_ENDPOINT
         self.key = settings.AZURE_DOC_INTEL_KEY
@@ -23,17 +31,24 @@ class AzureDIService:
                 credential=AzureKeyCredential(self.key)
             )
 
-    def analyze_document_from_url(self, document_url: str, pages: str = None) -> list:
+    def analyze_document_from_url(
+        self,
+        document_url: str,
+        pages: str = None,
+        polling_interval: float = 1.0
+    ) -> list:
         if not self.client:
             raise Exception("Azure Document Intelligence client not initialized")
 
         try:
             logger.info(f"[AzureDIService] Analyzing URL: {document_url[:60]}... Pages={pages}")
             # Stable SDK v3.3 uses begin_analyze_document_from_url
+            # polling_interval: SDK default is 5s, which dominates latency for small drawings
             poller = self.client.begin_analyze_document_from_url(
                 "prebuilt-layout",
                 document_url,
-                pages=pages
+                pages=pages,
+                polling_interval=polling_interval
             )
             # Timeout: 8 minutes max for polling (prevents indefinite hang)
             result = poller.result(timeout=480)
@@ -77,16 +92,28 @@ class AzureDIService:
             logger.error(f"[DI] Analysis failed: {e}")
             raise  # Always re-raise to prevent silent failures
 
-    def analyze_document_from_bytes(self, file_content: bytes) -> list:
+    def analyze_document_from_bytes(self, file_content: bytes, polling_interval: float = 1.0) -> list:
         if not self.client:
             raise Exception("Azure Document Intelligence client not initialized")
 
         # Stable SDK v3.3 uses begin_analyze_document with document=bytes
-        poller = self.client.begin_analyze_document("prebuilt-layout", document=file_content)
+        poller = self.client.begin_analyze_document(
+            "prebuilt-layout",
+            document=file_content,
+            polling_interval=polling_interval
+        )
         result = poller.result()
         
         return self._format_result(result)
 
+    async def analyze_document_from_url_async(self, document_url: str, **kwargs) -> list:
+        """analyze_document_from_url in a worker thread, so async endpoints keep the event loop free during the LRO wait."""
+        return await asyncio.to_thread(self.analyze_document_from_url, document_url, **kwargs)
+
+    async def analyze_document_from_bytes_async(self, file_content: bytes, **kwargs) -> list:
+        """analyze_document_from_bytes in a worker thread (see analyze_document_from_url_async)."""
+        return await asyncio.to_thread(self.analyze_document_from_bytes, file_content, **kwargs)
+
     def _format_result(self, result) -> list:
         output = []
         
@@ -113,73 +140,90 @@ class AzureDIService:
         
         # Start Page Processing
         # result.pages -> list of DocumentPage
-        if result.pages:
-            for page in result.pages:
-                page_num = page.page_number
-                
-                # Layout Lines
-                lines_data = []
-                if page.lines:
-                    for line in page.lines:
-                        lines_data.append({
-                            "content": line.content,
-                            "polygon": self._flatten_polygon(line.polygon)
-                        })
-                
-                # Layout Words (NEW: Extract words for fine-grained highlighting)
-                words_data = []
-                if page.words:
-                    for word in page.words:
-                        words_data.append({
-                            "content": word.content,
-                            "polygon": self._flatten_polygon(word.polygon),
-                            "confidence": word.confidence
-                        })
-                
-                # Page Tables
-                page_tables = tables_by_page.get(page_num, [])
-                
-                # Metadata Fallback
-                page_title = global_title
-                page_drawing_no = global_drawing_no
-                
-                if not page_title or not page_drawing_no:
-                    # Search tables
-                    for table in page_tables:
-                        cells = table.get("cells", [])
-                        for i, cell in enumerate(cells):
-                            content = cell.get("content", "").lower()
-                            if i + 1 < len(cells):
-                                next_cell_content = cells[i+1].get("content", "")
-                                if not page_title and ("title" in content or "도면명" in content):
-                                    page_title = next_cell_content
-                                if not page_drawing_no and ("dwg" in content or "drawing no" in content or "도면번호" in content):
-                                    page_drawing_no = next_cell_content
-
-                page_data = {
-                    "content": self._get_page_content(result.content, page.spans),
-                    "page_number": page_num,
-                    "tables_count": len(page_tables),
-                    "도면명(TITLE)": page_title,
-                    "도면번호(DWG. NO.)": page_drawing_no or "REV.",
-                    "layout": {
-                        "width": page.width,
-                        "height": page.height,
-                        "unit": str(page.unit) if page.unit else "pixel",
-                        "lines": lines_data,
-                        "words": words_data 
-                    },
-                    "tables": page_tables
-                }
-                output.append(page_data)
+        if not result.pages:
+            return output
+
+        format_page = functools.partial(
+            self._format_page,
+            result_content=result.content,
+            tables_by_page=tables_by_page,
+            global_title=global_title,
+            global_drawing_no=global_drawing_no
+        )
+
+        # Pages are independent; fan large documents out to a small pool.
+        # ex.map preserves page order.
+        if len(result.pages) > self.PARALLEL_FORMAT_MIN_PAGES:
+            with ThreadPoolExecutor(max_workers=self.FORMAT_WORKERS) as ex:
+                output = list(ex.map(format_page, result.pages))
+        else:
+            output = [format_page(page) for page in result.pages]
             
         return output
 
+    def _format_page(self, page, result_content, tables_by_page, global_title, global_drawing_no) -> dict:
+        page_num = page.page_number
+        
+        # Layout Lines
+        lines_data = []
+        if page.lines:
+            for line in page.lines:
+                lines_data.append({
+                    "content": line.content,
+                    "polygon": self._flatten_polygon(line.polygon)
+                })
+        
+        # Layout Words (NEW: Extract words for fine-grained highlighting)
+        words_data = []
+        if page.words:
+            for word in page.words:
+                words_data.append({
+                    "content": word.content,
+                    "polygon": self._flatten_polygon(word.polygon),
+                    "confidence": word.confidence
+                })
+        
+        # Page Tables
+        page_tables = tables_by_page.get(page_num, [])
+        
+        # Metadata Fallback
+        page_title = global_title
+        page_drawing_no = global_drawing_no
+        
+        if not page_title or not page_drawing_no:
+            # Search tables
+            for table in page_tables:
+                cells = table.get("cells", [])
+                for i, cell in enumerate(cells):
+                    content = cell.get("content", "").lower()
+                    if i + 1 < len(cells):
+                        next_cell_content = cells[i+1].get("content", "")
+                        if not page_title and ("title" in content or "도면명" in content):
+                            page_title = next_cell_content
+                        if not page_drawing_no and ("dwg" in content or "drawing no" in content or "도면번호" in content):
+                            page_drawing_no = next_cell_content
+
+        return {
+            "content": self._get_page_content(result_content, page.spans),
+            "page_number": page_num,
+            "tables_count": len(page_tables),
+            "도면명(TITLE)": page_title,
+            "도면번호(DWG. NO.)": page_drawing_no or "REV.",
+            "layout": {
+                "width": page.width,
+                "height": page.height,
+                "unit": str(page.unit) if page.unit else "pixel",
+                "lines": lines_data,
+                "words": words_data 
+            },
+            "tables": page_tables
+        }
+
     def _extract_tables(self, result) -> dict:
-        tables_by_page = {}
+        tables_by_page = defaultdict(list)
         
         if not result.tables:
-            return tables_by_page
+            return {}
 
         for table in result.tables:
             if not table.cells:
@@ -213,11 +257,9 @@ class AzureDIService:
                 "polygon": self._flatten_polygon(table.bounding_regions[0].polygon) if table.bounding_regions else None
             }
             
-            if page_num not in tables_by_page:
-                tables_by_page[page_num] = []
             tables_by_page[page_num].append(table_data)
             
-        return tables_by_page
+        return dict(tables_by_page)
 
     def _flatten_polygon(self, polygon) -> list:
         """
@@ -231,13 +273,20 @@ class AzureDIService:
         if all(isinstance(x, (int, float)) for x in polygon):
             return list(polygon)
             
-        # Check if it's a list of Point objects (x, y)
+        # Fast path: SDK v3.3 returns Point namedtuples - flatten in one pass
+        # without a temporary [x, y] list per point. Output stays a plain list
+        # because pages are json.dumps'd downstream.
+        if hasattr(polygon[0], 'x'):
+            return [float(c) for point in polygon for c in (point.x, point.y)]
+
         flat_list = []
         for point in polygon:
             if hasattr(point, 'x') and hasattr(point, 'y'):
-                flat_list.extend([float(point.x), float(point.y)])
+                flat_list.append(float(point.x))
+                flat_list.append(float(point.y))
             elif isinstance(point, (list, tuple)) and len(point) >= 2:
-                flat_list.extend([float(point[0]), float(point[1])])
+                flat_list.append(float(point[0]))
+                flat_list.append(float(point[1]))
         
         return flat_list
 
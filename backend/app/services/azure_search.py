@@ -1,18 +1,94 @@
+import asyncio
 import base64
-import json
+import hashlib
 import logging
+import math
+import queue
+import random
 import re
+import sys
+import threading
 import time
+from collections import defaultdict
+import httpx
+import numpy as np
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from openai import AzureOpenAI
 from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
+from azure.search.documents import SearchClient, SearchIndexingBufferedSender
+from azure.search.documents.aio import SearchClient as AsyncSearchClient
+from azure.search.documents.aio import SearchIndexingBufferedSender as AsyncSearchIndexingBufferedSender
 from app.core.config import settings
+from app.core.json_utils import dumps
 from app.services.blob_storage import get_container_client
 
 logger = logging.getLogger(__name__)
 
 
+def _ascii_json_len(text: str) -> int:
+    """Upper bound on the encoded length of an ASCII string (without its quotes)."""
+    size = len(text) + text.count('"') + text.count('\\')
+    if not text.isprintable():
+        size += 5 * sum(1 for c in text if c < ' ' or c == '\x7f')
+    return size
+
+
+def _estimate_doc_size(doc: dict) -> int:
+    """
+    Upper-bound estimate of a document's JSON payload bytes without encoding it.
+    ASCII text counts its escapes (one extra byte per quote or backslash, five
+    per control character, which also covers the short \\n/\\t forms);
+    non-ASCII text is counted at 6 bytes/char (the SDK's \\uXXXX escapes) and
+    each float in a vector at 24 (digits, sign and separator).
+    """
+    size = 2
+    for k, v in doc.items():
+        size += len(k) + 4  # quotes, colon, comma
+        if isinstance(v, str):
+            size += (_ascii_json_len(v) if v.isascii() else len(v) * 6) + 2
+        elif isinstance(v, list):
+            size += len(v) * 24 + 2
+        else:
+            size += 8
+    return size
+
+
+def _backoff_delay(attempt: int, cap: float = 30.0) -> float:
+    """
+    Full-jitter exponential backoff: uniform in [0, min(cap, 2^(attempt+1))].
+    Keeps the old 2s/4s/... ceiling but spreads concurrent upload workers so
+    they don't retry a throttled index in lockstep.
+    """
+    return random.uniform(0, min(cap, 2 ** (attempt + 1)))
+
+
+# Concatenated tag detection (HS + 9717 → HS9717)
+_LETTER_RE = re.compile(r'^[A-Z]{1,5}$')
+_NUMBER_RE = re.compile(r'^\d{1,5}[A-Z]?$')
+_TAG_MAX_DX = 0.15
+_TAG_MIN_DY = 0.005
+_TAG_MAX_DY = 0.25
+
+
+def _anchor_point(polygon):
+    """First (x, y) of a flat [x, y, ...] or nested [[x, y], ...] polygon, or None."""
+    if not polygon or len(polygon) < 2:
+        return None
+    try:
+        first = polygon[0]
+        if isinstance(first, (list, tuple)):
+            x, y = first[0], first[1]
+        else:
+            x, y = first, polygon[1]
+    except (TypeError, IndexError):
+        return None
+    if not (isinstance(x, (int, float)) and isinstance(y, (int, float))):
+        return None
+    if not (math.isfinite(x) and math.isfinite(y)):
+        return None
+    return x, y
+
+
 class AzureSearchService:
     def __init__(self):
         self.endpoint = settings.AZURE_SEARCH_ENDPOINT
@@ -32,24 +108,85 @@ class AzureSearchService:
         else:
             logger.warning("Azure Search credentials not found.")
 
+        # Blob URL prefix for metadata_storage_path (account/container are fixed per process)
+        self._blob_url_prefix = (
+            f"https://{settings.AZURE_STORAGE_ACCOUNT_NAME}.blob.core.windows.net/{settings.AZURE_BLOB_CONTAINER_NAME}/"
+            if settings.AZURE_STORAGE_ACCOUNT_NAME else ""
+        )
+
         # Embedding client (reuses the same Azure OpenAI endpoint)
         self.embedding_client = None
+        self.embedding_deployment = settings.AZURE_OPENAI_EMBEDDING_DEPLOYMENT
         if settings.AZURE_OPENAI_ENDPOINT and settings.AZURE_OPENAI_KEY:
             try:
                 self.embedding_client = AzureOpenAI(
                     azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
                     api_key=settings.AZURE_OPENAI_KEY,
                     api_version=settings.AZURE_OPENAI_API_VERSION,
+                    http_client=self._build_embedding_http_client(),
                 )
             except Exception as e:
                 logger.error(f"Failed to initialize embedding client: {e}")
 
+        # Adaptive upload rate (see _adapt_upload_rate)
+        self._upload_lock = threading.Lock()
+        self._current_batch_size = self.UPLOAD_BATCH_SIZE_MAX
+        self._max_workers = settings.AZURE_SEARCH_MAX_CONCURRENT_BATCHES or self.UPLOAD_WORKERS_MAX
+        self._current_workers = self._max_workers
+        self._throttle_events = 0
+        self._clean_waves = 0
+
+    def _build_embedding_http_client(self) -> httpx.Client:
+        """
+        One pooled client shared by all embedding threads. HTTP/2 multiplexes the
+        parallel batch requests over a single TLS connection; falls back to
+        HTTP/1.1 keep-alive when the 'h2' package is missing.
+        """
+        limits = httpx.Limits(max_keepalive_connections=16, max_connections=32)
+        try:
+            return httpx.Client(http2=True, limits=limits)
+        except ImportError:
+            logger.warning("h2 not installed; embedding client using HTTP/1.1.")
+            return httpx.Client(limits=limits)
+
+    # Page content is capped once when documents are built
+    MAX_CONTENT_LEN = 32000
+
+    # Index document schema. Pages are held as tuples in _META_KEYS order until
+    # their chunk is embedded, then zipped into dicts in _DOC_KEYS order.
+    _META_KEYS = (
+        "id", "user_id", "source", "page", "title", "category", "drawing_no",
+        "blob_path", "metadata_storage_path", "coords", "type",
+    )
+    _DOC_KEYS = _META_KEYS + ("content", "content_vector")
+
     # Zero vector fallback (3072 dimensions for text-embedding-3-large)
-    _ZERO_VECTOR = [0.0] * 3072
+    EMBEDDING_DIM = 3072
+    _ZERO_VECTOR = [0.0] * EMBEDDING_DIM
+
+    # Concurrent blob.exists() checks during orphan cleanup
+    BLOB_CHECK_WORKERS = 32
+
+    # Upload batching: start at the max, halve on 503/207, grow back after clean waves.
+    # Payload bytes are the primary gate (service limit is 16 MiB per request);
+    # the doc count cap only binds for small text-only docs.
+    UPLOAD_BATCH_SIZE_MAX = 1000
+    UPLOAD_MAX_PAYLOAD_BYTES = 14 * 1024 * 1024
+    UPLOAD_BATCH_SIZE_MIN = 5
+    UPLOAD_WORKERS_MAX = 4  # default when AZURE_SEARCH_MAX_CONCURRENT_BATCHES is unset
+    UPLOAD_GROW_AFTER_WAVES = 3
+    RETRYABLE_STATUS = (429, 500, 503)  # per-document statuses worth re-sending
+
+    # Embed/upload pipeline: pages per chunk (about one full upload wave of
+    # payload-bound ~70 KB vector docs) and how many embedded chunks may wait
+    # for upload before the embedder blocks
+    PIPELINE_CHUNK_PAGES = 800
+    PIPELINE_QUEUE_CHUNKS = 2
 
     # Batch embedding config
     EMBEDDING_BATCH_SIZE = 16      # texts per API call
     EMBEDDING_PARALLEL_BATCHES = 4 # concurrent API calls
+    EMBEDDING_MIN_CHARS = 32       # shorter (stripped) texts get the zero vector
 
     def _generate_embedding(self, text: str) -> list:
         """Generate embedding vector for a single text. Returns zero vector on failure."""
@@ -59,47 +196,80 @@ class AzureSearchService:
             truncated = text[:5500] if len(text) > 5500 else text
             response = self.embedding_client.embeddings.create(
                 input=truncated,
-                model=settings.AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
+                model=self.embedding_deployment,
             )
             return response.data[0].embedding
         except Exception as e:
             logger.warning(f"Embedding generation failed, using zero vector: {e}")
             return self._ZERO_VECTOR
 
-    def _generate_embeddings_batch(self, texts: list) -> list:
-        """Generate embeddings for multiple texts in a single API call."""
+    def _generate_embeddings_batch(self, texts: list) -> np.ndarray:
+        """
+        Generate embeddings for multiple texts in a single API call.
+        Returns a (len(texts), EMBEDDING_DIM) float32 array; failed rows stay zero.
+        """
+        results = np.zeros((len(texts), self.EMBEDDING_DIM), dtype=np.float32)
         if not self.embedding_client or not texts:
-            return [self._ZERO_VECTOR] * len(texts)
+            return results
         try:
             truncated = [t[:5500] if len(t) > 5500 else t for t in texts]
             response = self.embedding_client.embeddings.create(
                 input=truncated,
-                model=settings.AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
+                model=self.embedding_deployment,
             )
             # Response data is ordered by index
-            results = [self._ZERO_VECTOR] * len(texts)
             for item in response.data:
                 results[item.index] = item.embedding
             return results
         except Exception as e:
             logger.warning(f"Batch embedding failed ({len(texts)} texts), using zero vectors: {e}")
-            return [self._ZERO_VECTOR] * len(texts)
+            return results
 
-    def _generate_all_embeddings(self, texts: list) -> list:
-        """Generate embeddings for all texts using batch API + parallel execution."""
-        if not self.embedding_client or not texts:
-            return [self._ZERO_VECTOR] * len(texts)
+    def _generate_all_embeddings(self, texts: list) -> np.ndarray:
+        """
+        Generate embeddings for all texts using batch API + parallel execution.
+        Returns a (len(texts), EMBEDDING_DIM) float32 array; convert rows with
+        .tolist() only when building the upload document.
 
+        Near-empty texts (blank drawing pages) keep the zero row without an API
+        call, and identical texts are embedded once and scattered back.
+        """
         total = len(texts)
-        results = [self._ZERO_VECTOR] * total
+        results = np.zeros((total, self.EMBEDDING_DIM), dtype=np.float32)
+        if not self.embedding_client or not texts:
+            return results
+
+        # Dedupe by digest: unique_texts[src_idx[k]] fills results[dst_idx[k]]
+        unique_pos = {}
+        unique_texts = []
+        dst_idx = []
+        src_idx = []
+        for i, text in enumerate(texts):
+            if len(text.strip()) < self.EMBEDDING_MIN_CHARS:
+                continue
+            key = hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+            pos = unique_pos.get(key)
+            if pos is None:
+                pos = unique_pos[key] = len(unique_texts)
+                unique_texts.append(text)
+            dst_idx.append(i)
+            src_idx.append(pos)
+
+        unique_total = len(unique_texts)
+        if not unique_total:
+            logger.info("[AzureSearch] No embeddable text in %s pages, using zero vectors", total)
+            return results
 
         # Split into batches of EMBEDDING_BATCH_SIZE
         batches = []
-        for i in range(0, total, self.EMBEDDING_BATCH_SIZE):
-            batch_texts = texts[i:i + self.EMBEDDING_BATCH_SIZE]
+        for i in range(0, unique_total, self.EMBEDDING_BATCH_SIZE):
+            batch_texts = unique_texts[i:i + self.EMBEDDING_BATCH_SIZE]
             batches.append((i, batch_texts))
 
-        print(f"[AzureSearch] Embedding {total} texts in {len(batches)} batches ({self.EMBEDDING_PARALLEL_BATCHES} parallel)...", flush=True)
+        logger.info("[AzureSearch] Embedding %s unique texts of %s (%s blank) in %s batches (%s parallel)...",
+                    unique_total, total, total - len(dst_idx), len(batches), self.EMBEDDING_PARALLEL_BATCHES)
+
+        unique_vectors = np.zeros((unique_total, self.EMBEDDING_DIM), dtype=np.float32)
 
         # Process batches in parallel
         with ThreadPoolExecutor(max_workers=self.EMBEDDING_PARALLEL_BATCHES) as executor:
@@ -111,50 +281,49 @@ class AzureSearchService:
             completed = 0
             for future in as_completed(futures):
                 start_idx = futures[future]
-                batch_size = min(self.EMBEDDING_BATCH_SIZE, total - start_idx)
+                batch_size = min(self.EMBEDDING_BATCH_SIZE, unique_total - start_idx)
                 try:
-                    embeddings = future.result()
-                    for j, emb in enumerate(embeddings):
-                        results[start_idx + j] = emb
+                    unique_vectors[start_idx:start_idx + batch_size] = future.result()
                 except Exception as e:
                     logger.warning(f"Batch embedding at index {start_idx} failed: {e}")
 
                 completed += batch_size
-                if completed % 100 < batch_size or completed == total:
-                    print(f"[AzureSearch] Embedded {completed}/{total}...", flush=True)
+                if completed % 100 < batch_size or completed == unique_total:
+                    logger.info("[AzureSearch] Embedded %s/%s...", completed, unique_total)
 
+        results[dst_idx] = unique_vectors[src_idx]
         return results
 
-    def index_documents(self, filename: str, category: str, pages_data: list, blob_name: str = None):
+    def _prepare_documents(self, filename: str, category: str, pages_data: list, blob_name: str = None):
         """
-        Uploads analyzed pages to Azure AI Search.
+        Phase 1 of indexing: build per-page content text and document metadata
+        (no embedding yet). Returns (content_texts, doc_metas), index-aligned;
+        doc_metas are tuples in _META_KEYS order.
         """
-        if not self.client:
-            logger.warning("Search client is not initialized. Skipping indexing.")
-            return
-
         # Extract user_id from blob_name
-        user_id = "unknown"
-        if blob_name:
-            parts = blob_name.split('/')
-            if len(parts) > 0:
-                user_id = parts[0]
+        user_id = blob_name.split('/', 1)[0] if blob_name else "unknown"
 
         total_pages = len(pages_data)
-        print(f"[AzureSearch] Preparing {total_pages} documents...", flush=True)
+        logger.info("[AzureSearch] Preparing %s documents...", total_pages)
 
-        # Phase 1: Prepare content texts and document metadata (no embedding yet)
         content_texts = []
         doc_metas = []
 
+        # Same blob URL for every page of this file
+        metadata_storage_path = self._blob_url_prefix + blob_name if blob_name and self._blob_url_prefix else ""
+
+        # IDs stay base64 (not a hash) so re-indexing overwrites existing entries;
+        # encoded for all pages in one pass
+        id_base = f"{blob_name}_page_" if blob_name else f"{filename}_"
+        b64encode = base64.urlsafe_b64encode
+        doc_ids = [
+            b64encode(f"{id_base}{page.get('page_number', 0)}".encode()).rstrip(b"=").decode("ascii")
+            for page in pages_data
+        ]
+
         for page_idx, page in enumerate(pages_data):
             page_num = page.get("page_number", 0)
-
-            if blob_name:
-                doc_id_raw = f"{blob_name}_page_{page_num}"
-            else:
-                doc_id_raw = f"{filename}_{page_num}"
-            doc_id = base64.urlsafe_b64encode(doc_id_raw.encode()).decode().strip("=")
+            doc_id = doc_ids[page_idx]
 
             # Table-to-Markdown
             tables = page.get("tables", [])
@@ -163,23 +332,24 @@ class AzureSearchService:
                 table_md = self._format_tables_markdown(tables)
                 content_text += f"\n\n[Structured Tables]\n{table_md}"
 
+            # Layout is read once and reused for tags and coords
+            layout = page.get("layout") or {}
+            page_lines = layout.get("lines") or []
+
             # Concatenated equipment tags (HS + 9717 → HS9717)
-            page_lines = page.get("layout", {}).get("lines", [])
             concat_tags = self._extract_concatenated_tags(page_lines)
             if concat_tags:
                 content_text += f"\n[Concatenated Tags] {concat_tags}"
 
-            content_texts.append(content_text)
+            content_texts.append(content_text[:self.MAX_CONTENT_LEN])
 
             # Extract coords
             raw_coords = None
-            layout = page.get("layout", {})
             width = layout.get("width") or 1.0
             height = layout.get("height") or 1.0
 
-            lines = layout.get("lines", [])
-            if lines:
-                raw_coords = lines[0].get("polygon")
+            if page_lines:
+                raw_coords = page_lines[0].get("polygon")
             elif tables and tables[0].get("cells"):
                 raw_coords = tables[0]["cells"][0].get("polygon")
 
@@ -207,122 +377,333 @@ class AzureSearchService:
             elif category == "drawings":
                 content_type = "drawing"
 
-            doc_metas.append({
-                "id": doc_id,
-                "user_id": user_id,
-                "source": filename,
-                "page": str(page_num),
-                "title": page.get("도면명(TITLE)", "") or filename,
-                "category": category,
-                "drawing_no": page.get("도면번호(DWG. NO.)", ""),
-                "blob_path": blob_name,
-                "metadata_storage_path": f"https://{settings.AZURE_STORAGE_ACCOUNT_NAME}.blob.core.windows.net/{settings.AZURE_BLOB_CONTAINER_NAME}/{blob_name}" if blob_name and settings.AZURE_STORAGE_ACCOUNT_NAME else "",
-                "coords": json.dumps(normalized_coords) if normalized_coords else None,
-                "type": content_type,
-            })
-
-        # Phase 2: Batch embedding (parallel)
-        embeddings = self._generate_all_embeddings(content_texts)
-
-        # Phase 3: Assemble final documents
-        documents = []
-        for i in range(total_pages):
-            doc = doc_metas[i].copy()
-            doc["content"] = content_texts[i]
-            doc["content_vector"] = embeddings[i]
-            documents.append(doc)
-
-        # Phase 4: Parallel batch upload
-        if documents:
-            self._upload_all_batches(documents)
-            print(f"[AzureSearch] Completed indexing for {filename}.", flush=True)
+            # Most sets repeat one title block across pages; share a single
+            # string instead of one parsed copy per page
+            title = page.get("도면명(TITLE)", "") or filename
+            if isinstance(title, str):
+                title = sys.intern(title)
+
+            # Row in _META_KEYS order (a tuple is far smaller than a dict while
+            # the page waits for its embedding chunk)
+            doc_metas.append((
+                doc_id,
+                user_id,
+                filename,
+                str(page_num),
+                title,
+                category,
+                page.get("도면번호(DWG. NO.)", ""),
+                blob_name,
+                metadata_storage_path,
+                dumps(normalized_coords).decode() if normalized_coords else None,
+                content_type,
+            ))
+
+        return content_texts, doc_metas
+
+    def _embed_chunk(self, content_texts: list, doc_metas: list, start: int, end: int) -> list:
+        """
+        Embed pages [start, end) and return their finished upload documents.
+        Drops the caller's references to those pages so uploaded chunks can be freed.
+        """
+        embeddings = self._generate_all_embeddings(content_texts[start:end])
+        keys = self._DOC_KEYS
+        docs = []
+        for i in range(start, end):
+            # One construction per doc, sized for all fields
+            docs.append(dict(zip(keys, (*doc_metas[i], content_texts[i], embeddings[i - start].tolist()))))
+            content_texts[i] = doc_metas[i] = None
+        return docs
+
+    def index_documents(self, filename: str, category: str, pages_data: list, blob_name: str = None):
+        """
+        Uploads analyzed pages to Azure AI Search.
+        """
+        if not self.client:
+            logger.warning("Search client is not initialized. Skipping indexing.")
+            return
+
+        content_texts, doc_metas = self._prepare_documents(filename, category, pages_data, blob_name)
+        total_pages = len(content_texts)
+
+        # Phase 2: Embed chunk by chunk on a producer thread; each finished chunk
+        # is assembled and queued for upload, so embedding and upload overlap and
+        # only ~PIPELINE_QUEUE_CHUNKS chunks of vectors are alive at once.
+        chunk_queue = queue.Queue(maxsize=self.PIPELINE_QUEUE_CHUNKS)
+        producer_errors = []
+        stop = threading.Event()  # set when the consumer exits, even on error
+
+        def _put(item) -> bool:
+            # Bounded put that gives up once the consumer is gone, so the
+            # producer can't block forever on a queue nobody drains
+            while not stop.is_set():
+                try:
+                    chunk_queue.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def _produce():
+            try:
+                for start in range(0, total_pages, self.PIPELINE_CHUNK_PAGES):
+                    end = min(start + self.PIPELINE_CHUNK_PAGES, total_pages)
+                    if stop.is_set() or not _put(self._embed_chunk(content_texts, doc_metas, start, end)):
+                        return
+            except Exception as e:
+                producer_errors.append(e)
+            finally:
+                _put(None)
+
+        producer = threading.Thread(target=_produce, name="search-embed", daemon=True)
+        producer.start()
+
+        # Phase 3: Upload chunks as they arrive
+        uploaded = 0
+        sender = self._create_buffered_sender() if settings.AZURE_SEARCH_BUFFERED_UPLOAD else None
+        try:
+            while True:
+                docs = chunk_queue.get()
+                if docs is None:
+                    break
+                if sender:
+                    try:
+                        sender.upload_documents(documents=docs)
+                    except Exception as e:
+                        logger.error(f"Buffered upload failed: {e}")
+                else:
+                    self._upload_all_batches(docs)
+                uploaded += len(docs)
+                docs = None
+        finally:
+            stop.set()
+            # Drop chunks the upload loop never took (frees their vectors)
+            while True:
+                try:
+                    chunk_queue.get_nowait()
+                except queue.Empty:
+                    break
+            producer.join()
+            if sender:
+                sender.close()  # flushes queued actions
+
+        if producer_errors:
+            raise producer_errors[0]
+
+        if uploaded:
+            logger.info("[AzureSearch] Completed indexing for %s.", filename)
+            return True
+
+    async def aindex_documents(self, filename: str, category: str, pages_data: list, blob_name: str = None):
+        """
+        Async variant of index_documents for callers on the event loop.
+        Embedding (sync OpenAI client) runs in a worker thread one chunk ahead of
+        the upload; uploads use the aio SearchClient (or the aio buffered sender
+        when AZURE_SEARCH_BUFFERED_UPLOAD is on) and back off with asyncio.sleep,
+        so retries never block the loop.
+        """
+        if not self.client:
+            logger.warning("Search client is not initialized. Skipping indexing.")
+            return
+
+        content_texts, doc_metas = await asyncio.to_thread(
+            self._prepare_documents, filename, category, pages_data, blob_name
+        )
+        total_pages = len(content_texts)
+        starts = range(0, total_pages, self.PIPELINE_CHUNK_PAGES)
+
+        def _embed(start):
+            end = min(start + self.PIPELINE_CHUNK_PAGES, total_pages)
+            return asyncio.to_thread(self._embed_chunk, content_texts, doc_metas, start, end)
+
+        # aio clients are bound to the running loop's session: one per call
+        uploaded = 0
+        if settings.AZURE_SEARCH_BUFFERED_UPLOAD:
+            aclient = self._create_buffered_sender(aio=True)
+        else:
+            aclient = AsyncSearchClient(
+                endpoint=self.endpoint,
+                index_name=self.index_name,
+                credential=AzureKeyCredential(self.key),
+            )
+        async with aclient:  # the buffered sender flushes queued actions on exit
+            next_chunk = asyncio.ensure_future(_embed(starts[0])) if starts else None
+            try:
+                for i in range(len(starts)):
+                    docs = await next_chunk
+                    next_chunk = asyncio.ensure_future(_embed(starts[i + 1])) if i + 1 < len(starts) else None
+                    if settings.AZURE_SEARCH_BUFFERED_UPLOAD:
+                        try:
+                            await aclient.upload_documents(documents=docs)
+                        except Exception as e:
+                            logger.error(f"Buffered upload failed: {e}")
+                    else:
+                        await self._aupload_all_batches(aclient, docs)
+                    uploaded += len(docs)
+            finally:
+                if next_chunk:
+                    next_chunk.cancel()
+
+        if uploaded:
+            logger.info("[AzureSearch] Completed indexing for %s.", filename)
             return True
 
+    def _create_buffered_sender(self, aio: bool = False):
+        """
+        SDK-managed uploader (AZURE_SEARCH_BUFFERED_UPLOAD): auto-flushes, splits
+        oversized batches and retries throttled actions itself. One sender per
+        index_documents / aindex_documents call; close() flushes whatever is still
+        queued. aio=True returns the async sender (its hooks are awaited).
+        """
+        def _on_error(action):
+            logger.warning(f"Buffered indexing action failed: {action}")
+
+        async def _aon_error(action):
+            _on_error(action)
+
+        sender_cls = AsyncSearchIndexingBufferedSender if aio else SearchIndexingBufferedSender
+        return sender_cls(
+            endpoint=self.endpoint,
+            index_name=self.index_name,
+            credential=AzureKeyCredential(self.key),
+            auto_flush_interval=60,
+            initial_batch_action_count=512,
+            on_error=_aon_error if aio else _on_error,
+        )
+
     def _upload_all_batches(self, documents: list):
-        """Split documents into batches and upload in parallel."""
-        BATCH_SIZE = 50
-        MAX_PAYLOAD_SIZE = 4 * 1024 * 1024
-        UPLOAD_WORKERS = 4
+        """
+        Split documents into batches and upload in parallel.
+        Uploads run in waves of `_current_workers` batches; after each wave the
+        batch size and worker count adapt to throttling (see _adapt_upload_rate).
+        """
+        total_docs = len(documents)
+        logger.info("[AzureSearch] Uploading %s docs (batch=%s, %s parallel)...", total_docs, self._current_batch_size, self._current_workers)
+
+        pos = 0
+        while pos < total_docs:
+            batch_size, workers = self._current_batch_size, self._current_workers
+            batches, pos = self._build_batches(documents, pos, batch_size, max_batches=workers)
+
+            throttles_before = self._throttle_events
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(self._upload_batch_with_retry, batch): idx for idx, batch in enumerate(batches)}
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        logger.error(f"Batch upload failed: {e}")
+
+            largest = max((len(b) for b in batches), default=batch_size)
+            self._adapt_upload_rate(throttled=self._throttle_events > throttles_before, largest_batch=largest)
+
+    def _build_batches(self, documents: list, start: int, batch_size: int, max_batches: int):
+        """
+        Take up to `max_batches` batches from documents[start:], each capped at
+        `batch_size` docs and UPLOAD_MAX_PAYLOAD_BYTES. Returns (batches, next_start).
+        """
+        max_payload = self.UPLOAD_MAX_PAYLOAD_BYTES
 
-        # Build batches
         batches = []
         current_batch = []
         current_batch_size = 0
 
-        for doc in documents:
-            if "content_exact" in doc and len(doc["content_exact"]) > 1000:
-                doc["content_exact"] = doc["content_exact"][:1000]
+        pos = start
+        while pos < len(documents):
+            doc = documents[pos]
+            doc_size = _estimate_doc_size(doc)
 
-            doc_size = len(json.dumps(doc))
-
-            if (len(current_batch) >= BATCH_SIZE) or (current_batch_size + doc_size > MAX_PAYLOAD_SIZE):
+            if current_batch and ((len(current_batch) >= batch_size) or (current_batch_size + doc_size > max_payload)):
                 batches.append(current_batch)
                 current_batch = []
                 current_batch_size = 0
+                if len(batches) >= max_batches:
+                    return batches, pos
 
             current_batch.append(doc)
             current_batch_size += doc_size
+            pos += 1
 
         if current_batch:
             batches.append(current_batch)
 
-        total_docs = len(documents)
-        print(f"[AzureSearch] Uploading {total_docs} docs in {len(batches)} batches ({UPLOAD_WORKERS} parallel)...", flush=True)
+        return batches, pos
 
-        # Upload batches in parallel
-        with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
-            futures = {executor.submit(self._upload_batch_with_retry, batch): idx for idx, batch in enumerate(batches)}
-            for future in as_completed(futures):
-                try:
-                    future.result()
-                except Exception as e:
-                    logger.error(f"Batch upload failed: {e}")
+    def _signal_throttle(self):
+        with self._upload_lock:
+            self._throttle_events += 1
+
+    def _adapt_upload_rate(self, throttled: bool, largest_batch: int = None):
+        """
+        Halve batch size and upload workers after a throttled wave; double them
+        back (up to the configured maximum) after UPLOAD_GROW_AFTER_WAVES clean waves.
+        State is shared by concurrent index_documents calls on this service.
+        """
+        with self._upload_lock:
+            if throttled:
+                # Halve what was actually sent: payload-bound batches can sit far
+                # below the doc-count cap
+                effective = min(self._current_batch_size, largest_batch or self._current_batch_size)
+                self._current_batch_size = max(self.UPLOAD_BATCH_SIZE_MIN, effective // 2)
+                self._current_workers = max(1, self._current_workers // 2)
+                self._clean_waves = 0
+                logger.info("[AzureSearch] Throttled: batch=%s, workers=%s", self._current_batch_size, self._current_workers)
+                return
+
+            self._clean_waves += 1
+            if self._clean_waves < self.UPLOAD_GROW_AFTER_WAVES:
+                return
+            self._clean_waves = 0
+            if self._current_batch_size < self.UPLOAD_BATCH_SIZE_MAX or self._current_workers < self._max_workers:
+                self._current_batch_size = min(self.UPLOAD_BATCH_SIZE_MAX, self._current_batch_size * 2)
+                self._current_workers = min(self._max_workers, self._current_workers * 2)
+                logger.info("[AzureSearch] Upload rate restored: batch=%s, workers=%s", self._current_batch_size, self._current_workers)
 
     def _extract_concatenated_tags(self, lines_data: list) -> str:
         """Adjacent letter+number OCR lines → combined tags (e.g., HS + 9717 → HS9717)"""
-        tags = []
-        used = set()
-        for i, l1 in enumerate(lines_data):
-            if i in used:
+        # Classify each line once, bucketing number lines on a grid whose cells
+        # match the pairing window, so each letter only probes its 3x3 neighbourhood.
+        letters = []
+        num_grid = defaultdict(list)
+        for idx, line in enumerate(lines_data):
+            text = line.get("content", "").strip()
+            is_letter = _LETTER_RE.match(text) is not None
+            if not is_letter and not _NUMBER_RE.match(text):
                 continue
-            t1 = l1.get("content", "").strip()
-            if not re.match(r'^[A-Z]{1,5}$', t1):
+            point = _anchor_point(line.get("polygon", []))
+            if point is None:
                 continue
-            p1 = l1.get("polygon", [])
-            for j, l2 in enumerate(lines_data):
-                if j == i or j in used:
-                    continue
-                t2 = l2.get("content", "").strip()
-                if not re.match(r'^\d{1,5}[A-Z]?$', t2):
-                    continue
-                p2 = l2.get("polygon", [])
-                if len(p1) >= 2 and len(p2) >= 2:
-                    # Handle nested polygon format [[x,y], ...] vs flat [x, y, ...]
-                    try:
-                        p1x = p1[0][0] if isinstance(p1[0], (list, tuple)) else p1[0]
-                        p1y = p1[0][1] if isinstance(p1[0], (list, tuple)) else p1[1]
-                        p2x = p2[0][0] if isinstance(p2[0], (list, tuple)) else p2[0]
-                        p2y = p2[0][1] if isinstance(p2[0], (list, tuple)) else p2[1]
-                        if not all(isinstance(v, (int, float)) for v in (p1x, p1y, p2x, p2y)):
+            x, y = point
+            if is_letter:
+                letters.append((text, x, y))
+            else:
+                num_grid[(int(x // _TAG_MAX_DX), int(y // _TAG_MAX_DY))].append((idx, text, x, y))
+
+        tags = []
+        used = set()
+        for text, x, y in letters:
+            cx, cy = int(x // _TAG_MAX_DX), int(y // _TAG_MAX_DY)
+            best = None  # lowest-index match wins, as in document order
+            for gx in (cx - 1, cx, cx + 1):
+                for gy in (cy - 1, cy, cy + 1):
+                    for idx, num_text, nx, ny in num_grid.get((gx, gy), ()):
+                        if idx in used or (best is not None and idx >= best[0]):
                             continue
-                        dx = abs(p1x - p2x)
-                        dy = abs(p1y - p2y)
-                    except (TypeError, IndexError):
-                        continue
-                    if dx < 0.15 and 0.005 < dy < 0.25:
-                        tags.append(f"{t1}{t2}")
-                        used.add(i)
-                        used.add(j)
-                        break
+                        if abs(x - nx) < _TAG_MAX_DX and _TAG_MIN_DY < abs(y - ny) < _TAG_MAX_DY:
+                            best = (idx, num_text)
+                            break  # cell entries are in index order
+            if best:
+                used.add(best[0])
+                tags.append(f"{text}{best[1]}")
         return " ".join(tags)
 
     def _format_tables_markdown(self, tables: list) -> str:
         """
         Convert DI table objects into a Markdown string.
         """
-        md_output = ""
+        parts = []  # appended pieces, joined once (str += is quadratic in total size)
         for i, table in enumerate(tables):
-            md_output += f"\nTable {i+1}:\n"
+            parts.append(f"\nTable {i+1}:\n")
 
             row_count = table.get("row_count", 0)
             col_count = table.get("column_count", 0)
@@ -330,45 +711,124 @@ class AzureSearchService:
 
             if not cells: continue
 
-            # Reconstruct grid
-            grid = [["" for _ in range(col_count)] for _ in range(row_count)]
+            # Sparse (row, col) -> text; drawing tables are mostly empty cells
+            sparse = {}
             for cell in cells:
                 r, c = cell.get("row_index", 0), cell.get("column_index", 0)
                 if r < row_count and c < col_count:
-                    grid[r][c] = (cell.get("content") or "").replace("\n", " ").strip()
+                    sparse[(r, c)] = (cell.get("content") or "").replace("\n", " ").strip()
 
             # Format as Markdown
-            for r_idx, row in enumerate(grid):
-                md_output += "| " + " | ".join(row) + " |\n"
+            columns = range(col_count)
+            for r_idx in range(row_count):
+                parts.append("| ")
+                parts.append(" | ".join([sparse.get((r_idx, c), "") for c in columns]))
+                parts.append(" |\n")
                 if r_idx == 0:
-                    md_output += "| " + " | ".join(["---"] * col_count) + " |\n"
-            md_output += "\n"
-        return md_output
+                    parts.append("| " + " | ".join(["---"] * col_count) + " |\n")
+            parts.append("\n")
+        return "".join(parts)
 
     def _upload_batch_with_retry(self, batch, max_retries=3):
         """
-        Uploads a batch of documents with exponential backoff retry.
+        Uploads a batch of documents with jittered exponential backoff retry.
+        On a partial (207) failure only the documents rejected with a transient
+        status are sent again.
         """
         if not batch: return
 
+        pending = batch
         for attempt in range(max_retries):
             try:
-                result = self.client.upload_documents(documents=batch)
+                pending = self._pending_after_upload(pending, self.client.upload_documents(documents=pending))
+                if not pending:
+                    return
+            except Exception as e:
+                self._note_upload_error(e, attempt, max_retries)
+            if attempt < max_retries - 1:
+                time.sleep(_backoff_delay(attempt))
+        logger.error(f"Final failure uploading {len(pending)} docs after {max_retries} attempts.")
+
+    def _pending_after_upload(self, pending: list, result) -> list:
+        """
+        Documents of `pending` to send again after an upload: those rejected with a
+        RETRYABLE_STATUS. Non-retryable rejections are logged and dropped; only
+        retryable ones count as throttling (a 207 of 400s is not backpressure).
+        """
+        failed = [r for r in result if not r.succeeded]
+        if not failed:
+            logger.info("[AzureSearch] Indexed batch of %s documents.", len(pending))
+            return []
+
+        logger.warning(f"Partial indexing failure: {len(failed)} docs failed in batch.")
+        retry_keys = {r.key for r in failed if r.status_code in self.RETRYABLE_STATUS}
+        if retry_keys:
+            self._signal_throttle()
+        if len(retry_keys) < len(failed):
+            logger.error(f"Dropping {len(failed) - len(retry_keys)} docs with non-retryable errors: "
+                         f"{[(r.key, r.status_code, r.error_message) for r in failed if r.key not in retry_keys][:5]}")
+        return [d for d in pending if d["id"] in retry_keys]
+
+    def _note_upload_error(self, e: Exception, attempt: int, max_retries: int):
+        """Log a failed upload request; 429/503 responses count as throttling."""
+        logger.warning("[AzureSearch] Batch upload failed (Attempt %s/%s): %s", attempt+1, max_retries, e)
+        if getattr(e, "status_code", None) in (429, 503):
+            self._signal_throttle()
+
+    async def _aupload_all_batches(self, aclient, documents: list):
+        """Async counterpart of _upload_all_batches (same waves and rate adaptation)."""
+        total_docs = len(documents)
+        logger.info("[AzureSearch] Uploading %s docs (batch=%s, %s parallel)...",
+                    total_docs, self._current_batch_size, self._current_workers)
+
+        pos = 0
+        while pos < total_docs:
+            batch_size, workers = self._current_batch_size, self._current_workers
+            batches, pos = self._build_batches(documents, pos, batch_size, max_batches=workers)
+
+            throttles_before = self._throttle_events
+            results = await asyncio.gather(
+                *(self._aupload_batch_with_retry(aclient, batch) for batch in batches),
+                return_exceptions=True,
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.error(f"Batch upload failed: {result}")
 
-                # Check for partial failures
-                if not all(r.succeeded for r in result):
-                    failed = [r for r in result if not r.succeeded]
-                    logger.warning(f"Partial indexing failure: {len(failed)} docs failed in batch.")
+            largest = max((len(b) for b in batches), default=batch_size)
+            self._adapt_upload_rate(throttled=self._throttle_events > throttles_before, largest_batch=largest)
 
-                print(f"[AzureSearch] Indexed batch of {len(batch)} documents.", flush=True)
-                return
+    async def _aupload_batch_with_retry(self, aclient, batch, max_retries=3):
+        """Async counterpart of _upload_batch_with_retry (awaits the backoff)."""
+        if not batch: return
+
+        pending = batch
+        for attempt in range(max_retries):
+            try:
+                pending = self._pending_after_upload(pending, await aclient.upload_documents(documents=pending))
+                if not pending:
+                    return
             except Exception as e:
-                print(f"[AzureSearch] Batch upload failed (Attempt {attempt+1}/{max_retries}): {e}", flush=True)
+                self._note_upload_error(e, attempt, max_retries)
+            if attempt < max_retries - 1:
+                await asyncio.sleep(_backoff_delay(attempt))
+        logger.error(f"Final failure uploading {len(pending)} docs after {max_retries} attempts.")
+
+    def _delete_batch_with_retry(self, batch, max_retries=3) -> int:
+        """
+        Deletes a batch of documents with exponential backoff retry
+        (covers 503 throttling). Returns the number of documents deleted.
+        """
+        for attempt in range(max_retries):
+            try:
+                result = self.client.delete_documents(documents=batch)
+                return sum(1 for r in result if r.succeeded)
+            except Exception as e:
+                logger.warning("[AzureSearch] Batch delete failed (Attempt %s/%s): %s", attempt+1, max_retries, e)
                 if attempt < max_retries - 1:
-                    time.sleep(2 ** (attempt + 1))
+                    time.sleep(_backoff_delay(attempt))
                 else:
-                    logger.error(f"Final failure uploading batch: {e}")
-
+                    raise
 
     def get_indexed_facets(self, username: str) -> dict:
         """
@@ -379,21 +839,34 @@ class AzureSearchService:
             logger.warning("Search client not initialized. Cannot get facets.")
             return {}
 
-        try:
+        def _source_facets(search_text):
             results = self.client.search(
-                search_text="*",
+                search_text=search_text,
                 filter=f"blob_path ge '{username}/' and blob_path lt '{username}0'",
                 facets=["source,count:1000"],
-                top=0
+                top=0,
+                include_total_count=False,
             )
             facets = results.get_facets()
             if not facets or "source" not in facets:
                 return {}
             return {f["value"]: f["count"] for f in facets["source"]}
+
+        # Filter-only query (no search text) skips the full-text scoring path;
+        # fall back to the old match-all query if the service rejects it.
+        try:
+            return _source_facets(None)
+        except Exception as e:
+            logger.warning(f"Filter-only facet query failed for {username}, retrying with '*': {e}")
+        try:
+            return _source_facets("*")
         except Exception as e:
             logger.error(f"Failed to get indexed facets for {username}: {e}")
             return {}
 
+    # Caps docs per cleanup query; also what lifts the page size from 50 to 1000
+    CLEANUP_QUERY_TOP = 100000
+
     def cleanup_orphaned_index(self, username: str) -> dict:
         """
         Finds index documents whose blob no longer exists and deletes them.
@@ -403,61 +876,61 @@ class AzureSearchService:
             logger.warning("Search client not initialized.")
             return {"deleted_count": 0, "deleted_files": []}
 
-        print(f"[AzureSearch] Starting orphaned index cleanup for user: {username}", flush=True)
+        logger.info("[AzureSearch] Starting orphaned index cleanup for user: %s", username)
 
-        # 1. Collect all index documents for this user (paginate with skip)
+        # 1. Collect all index documents for this user
+        # One query walked with by_page(). A top above the 1000-doc page limit makes the
+        # service return full 1000-doc pages (without it, 50 per page); each continuation
+        # is still a $skip request, so the service's 100k $skip ceiling applies.
         all_docs = []  # list of {"id": ..., "blob_path": ..., "source": ...}
-        BATCH = 1000
-        skip = 0
         try:
-            while True:
-                results = self.client.search(
-                    search_text="*",
-                    filter=f"blob_path ge '{username}/' and blob_path lt '{username}0'",
-                    select=["id", "blob_path", "source"],
-                    top=BATCH,
-                    skip=skip,
-                )
-                page_docs = []
-                for doc in results:
-                    page_docs.append({
+            results = self.client.search(
+                search_text="*",
+                filter=f"blob_path ge '{username}/' and blob_path lt '{username}0'",
+                select=["id", "blob_path", "source"],
+                top=self.CLEANUP_QUERY_TOP,
+            )
+            for page in results.by_page():
+                for doc in page:
+                    all_docs.append({
                         "id": doc["id"],
                         "blob_path": doc.get("blob_path", ""),
                         "source": doc.get("source", ""),
                     })
-                all_docs.extend(page_docs)
-                if len(page_docs) < BATCH:
-                    break
-                skip += BATCH
         except Exception as e:
             logger.error(f"Failed to query index for cleanup: {e}")
             return {"deleted_count": 0, "deleted_files": []}
 
-        print(f"[AzureSearch] Found {len(all_docs)} index documents for {username}", flush=True)
+        logger.info("[AzureSearch] Found %s index documents for %s", len(all_docs), username)
 
         if not all_docs:
             return {"deleted_count": 0, "deleted_files": []}
 
         # 2. Get unique blob_paths and check existence
-        unique_paths = set(d["blob_path"] for d in all_docs if d["blob_path"])
-        print(f"[AzureSearch] Checking {len(unique_paths)} unique blob paths...", flush=True)
+        unique_paths = list(set(d["blob_path"] for d in all_docs if d["blob_path"]))
+        logger.info("[AzureSearch] Checking %s unique blob paths...", len(unique_paths))
 
         missing_paths = set()
         try:
             container_client = get_container_client()
-            for blob_path in unique_paths:
+
+            def _exists(blob_path):
                 try:
-                    blob_client = container_client.get_blob_client(blob_path)
-                    if not blob_client.exists():
-                        missing_paths.add(blob_path)
+                    return container_client.get_blob_client(blob_path).exists()
                 except Exception:
-                    missing_paths.add(blob_path)
+                    return False
+
+            # Each exists() is a network round-trip; overlap them (client is thread-safe)
+            with ThreadPoolExecutor(max_workers=self.BLOB_CHECK_WORKERS) as executor:
+                for blob_path, exists in zip(unique_paths, executor.map(_exists, unique_paths)):
+                    if not exists:
+                        missing_paths.add(blob_path)
         except Exception as e:
             logger.error(f"Failed to check blob existence: {e}")
             return {"deleted_count": 0, "deleted_files": []}
 
         if not missing_paths:
-            print(f"[AzureSearch] No orphaned index entries found.", flush=True)
+            logger.info("[AzureSearch] No orphaned index entries found.")
             return {"deleted_count": 0, "deleted_files": []}
 
         # 3. Collect doc IDs to delete and filenames
@@ -466,23 +939,28 @@ class AzureSearchService:
             d["source"] for d in all_docs if d["blob_path"] in missing_paths and d["source"]
         ))
 
-        print(f"[AzureSearch] Found {len(docs_to_delete)} orphaned documents from {len(deleted_files)} files", flush=True)
+        logger.info("[AzureSearch] Found %s orphaned documents from %s files", len(docs_to_delete), len(deleted_files))
 
-        # 4. Batch delete (1000 docs per batch)
+        # 4. Batch delete (1000 docs per batch, parallel like uploads)
         BATCH_SIZE = 1000
+        DELETE_WORKERS = 4
+        delete_batches = [
+            [{"id": doc_id} for doc_id in docs_to_delete[i:i + BATCH_SIZE]]
+            for i in range(0, len(docs_to_delete), BATCH_SIZE)
+        ]
         total_deleted = 0
-        for i in range(0, len(docs_to_delete), BATCH_SIZE):
-            batch_ids = docs_to_delete[i:i + BATCH_SIZE]
-            batch_docs = [{"id": doc_id} for doc_id in batch_ids]
-            try:
-                result = self.client.delete_documents(documents=batch_docs)
-                succeeded = sum(1 for r in result if r.succeeded)
-                total_deleted += succeeded
-                print(f"[AzureSearch] Deleted batch {i // BATCH_SIZE + 1}: {succeeded}/{len(batch_ids)}", flush=True)
-            except Exception as e:
-                logger.error(f"Batch delete failed at offset {i}: {e}")
+        with ThreadPoolExecutor(max_workers=DELETE_WORKERS) as executor:
+            futures = {executor.submit(self._delete_batch_with_retry, batch): idx for idx, batch in enumerate(delete_batches)}
+            for future in as_completed(futures):
+                idx = futures[future]
+                try:
+                    succeeded = future.result()
+                    total_deleted += succeeded
+                    logger.info("[AzureSearch] Deleted batch %s: %s/%s", idx + 1, succeeded, len(delete_batches[idx]))
+                except Exception as e:
+                    logger.error(f"Batch delete failed at offset {idx * BATCH_SIZE}: {e}")
 
-        print(f"[AzureSearch] Cleanup complete: {total_deleted} documents deleted", flush=True)
+        logger.info("[AzureSearch] Cleanup complete: %s documents deleted", total_deleted)
         return {"deleted_count": total_deleted, "deleted_files": deleted_files}
 
     def cleanup_all_users(self) -> dict:
@@ -492,7 +970,7 @@ class AzureSearchService:
         """
         from app.services.blob_storage import get_container_client
 
-        print("[AzureSearch] Starting cleanup for ALL users...", flush=True)
+        logger.info("[AzureSearch] Starting cleanup for ALL users...")
         container_client = get_container_client()
 
         # List top-level folders (usernames)
@@ -502,7 +980,7 @@ class AzureSearchService:
                 folder = item.name.rstrip("/")
                 users.append(folder)
 
-        print(f"[AzureSearch] Found {len(users)} top-level folders", flush=True)
+        logger.info("[AzureSearch] Found %s top-level folders", len(users))
 
         total_deleted = 0
         all_deleted_files = []
@@ -516,9 +994,9 @@ class AzureSearchService:
                         f"{user}: {f}" for f in result["deleted_files"]
                     )
             except Exception as e:
-                print(f"[AzureSearch] Cleanup failed for user {user}: {e}", flush=True)
+                logger.warning("[AzureSearch] Cleanup failed for user %s: %s", user, e)
 
-        print(f"[AzureSearch] All-user cleanup complete: {total_deleted} total documents deleted across {len(users)} users", flush=True)
+        logger.info("[AzureSearch] All-user cleanup complete: %s total documents deleted across %s users", total_deleted, len(users))
         return {
             "users_scanned": len(users),
             "deleted_count": total_deleted,
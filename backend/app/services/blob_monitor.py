@@ -6,16 +6,20 @@ Runs as a background task polling for new files without corresponding JSON.
 """
 
 import asyncio
+import logging
 import os
-import tempfile
-from datetime import datetime, timedelta
-from typing import Set
-from azure.storage.blob import ContainerClient
+import re
+from datetime import datetime
+from typing import Dict, Optional, Set, Tuple
+from azure.storage.blob import BlobPrefix, ContainerClient
 
+from app.core.config import settings
 from app.services.blob_storage import get_container_client
 from app.services.status_manager import status_manager
 from app.services.robust_analysis_manager import robust_analysis_manager
 
+logger = logging.getLogger(__name__)
+
 
 def _count_pdf_pages(blob_data: bytes) -> int:
     """Count pages in a PDF using PyMuPDF without writing to disk."""
@@ -26,92 +30,192 @@ def _count_pdf_pages(blob_data: bytes) -> int:
         doc.close()
         return page_count
     except Exception as e:
-        print(f"[BlobMonitor] Failed to count PDF pages: {e}")
+        logger.warning("[BlobMonitor] Failed to count PDF pages: %s", e)
         return 0
 
 
+# Linearization dictionary (first object of a "fast web view" PDF): /L is the
+# file length it was written for, /N the page count
+_LINEARIZED_RE = re.compile(rb"<<\s*/Linearized\b([^>]*)>>")
+_LIN_L_RE = re.compile(rb"/L\s+(\d+)")
+_LIN_N_RE = re.compile(rb"/N\s+(\d+)")
+_HEAD_RANGE = 4096
+_DOWNLOAD_CONCURRENCY = 4
+
+
+def _count_blob_pdf_pages(blob_client) -> int:
+    """
+    Page count of a PDF blob without downloading it when possible.
+    Blocking (storage I/O); call it via asyncio.to_thread from async code.
+    Reads the first few KB and trusts the linearization /N if its /L matches the
+    blob size (an incremental update after linearization invalidates it);
+    otherwise falls back to a full download + PyMuPDF.
+    """
+    try:
+        size = blob_client.get_blob_properties().size
+        if size > _HEAD_RANGE:
+            head = blob_client.download_blob(offset=0, length=_HEAD_RANGE).readall()
+            m = _LINEARIZED_RE.search(head)
+            if m:
+                lin_l = _LIN_L_RE.search(m.group(1))
+                lin_n = _LIN_N_RE.search(m.group(1))
+                if lin_l and lin_n and int(lin_l.group(1)) == size and int(lin_n.group(1)) > 0:
+                    return int(lin_n.group(1))
+    except Exception as e:
+        logger.warning("[BlobMonitor] Range read for page count failed, downloading full PDF: %s", e)
+
+    pdf_data = blob_client.download_blob(max_concurrency=_DOWNLOAD_CONCURRENCY).readall()
+    return _count_pdf_pages(pdf_data)
+
+
 class BlobMonitor:
     """Monitors blob storage for new PDF uploads"""
 
+    # Drop the incremental index and re-list everything every N polls, so
+    # deleted JSON outputs and other changes the watermark can't see are picked up
+    FULL_RESYNC_POLLS = 12
+    # Listing page size (service maximum); the SDK default is 1000 per round-trip
+    LIST_PAGE_SIZE = 5000
+
     def __init__(self):
         self.processing: Set[str] = set()  # Track files currently being processed
-        self.poll_interval = 300  # seconds (5 min - cost optimization)
+        # seconds (5 min - cost optimization); hourly safety net when Event Grid pushes uploads
+        self.poll_interval = 3600 if settings.EVENTGRID_WEBHOOK_SECRET else 300
+        self.last_seen_ts: Optional[datetime] = None  # newest knowhow blob last_modified seen
+        # Incremental index keyed by (username, base name), updated from the delta listing
+        self._pdfs: Dict[Tuple[str, str], str] = {}  # -> pdf blob name
+        self._jsons: Set[Tuple[str, str]] = set()    # analysis output confirmed
+        self._polls = 0
 
     async def start_monitor(self):
         """Start the monitoring loop"""
-        print("[BlobMonitor] Starting blob storage monitor...")
+        logger.info("[BlobMonitor] Starting blob storage monitor...")
 
         while True:
             try:
                 await self.check_for_new_files()
             except Exception as e:
-                print(f"[BlobMonitor] Error in monitoring loop: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("[BlobMonitor] Error in monitoring loop: %s", e)
 
             await asyncio.sleep(self.poll_interval)
 
+    @staticmethod
+    def _has_json(container: ContainerClient, username: str, base_name: str) -> bool:
+        """Analysis output exists: split format ({base}/meta.json) or legacy {base}.json."""
+        for json_path in (f"{username}/json/{base_name}/meta.json", f"{username}/json/{base_name}.json"):
+            if container.get_blob_client(json_path).exists():
+                return True
+        return False
+
     async def check_for_new_files(self):
         """Check for PDFs without corresponding JSON"""
         container = get_container_client()
 
-        # Get all blobs
-        all_blobs = list(container.list_blobs())
-
-        # Group by user and find PDFs in knowhow without JSON
-        users_with_files = {}
-
-        for blob in all_blobs:
-            parts = blob.name.split('/')
-            if len(parts) < 3:
-                continue
-
-            username = parts[0]
-            folder = parts[1]
-            filename = parts[2]
-
-            # Look for PDFs in knowhow
-            if folder == 'knowhow' and filename.lower().endswith('.pdf'):
-                if username not in users_with_files:
-                    users_with_files[username] = {'pdfs': [], 'jsons': set()}
-                users_with_files[username]['pdfs'].append(blob.name)
-
-            # Track JSON files
-            elif folder == 'json' and filename.lower().endswith('.json'):
-                if username not in users_with_files:
-                    users_with_files[username] = {'pdfs': [], 'jsons': set()}
-                # Store base name without .json extension
-                base_name = filename[:-5]  # Remove .json
-                users_with_files[username]['jsons'].add(base_name)
-
-        # Find PDFs without JSON
-        for username, files in users_with_files.items():
-            for pdf_blob in files['pdfs']:
-                pdf_filename = os.path.basename(pdf_blob)
-                base_name = pdf_filename[:-4]  # Remove .pdf
-
-                # Check if JSON exists
-                if base_name not in files['jsons']:
-                    # Check if already processing
-                    if pdf_blob in self.processing:
-                        continue
-
-                    # Check status - don't re-trigger if in progress or failed
-                    status = status_manager.get_status(pdf_filename, username=username)
-                    if status:
-                        state = status.get('status', '')
-                        if state in ['in_progress', 'retrying', 'finalizing']:
-                            print(f"[BlobMonitor] Skipping {pdf_filename} - already {state}")
-                            continue
-                        elif state == 'failed':
-                            retry_count = status.get('retry_count', 0)
-                            if retry_count >= 3:
-                                print(f"[BlobMonitor] Skipping {pdf_filename} - max retries exceeded")
-                                continue
-
-                    # New file found - trigger analysis
-                    print(f"[BlobMonitor] Found new PDF without JSON: {pdf_blob}")
-                    await self.trigger_analysis(pdf_blob, username)
+        resync = self._polls % self.FULL_RESYNC_POLLS == 0
+        if resync:
+            self.last_seen_ts = None
+            self._pdfs.clear()
+            self._jsons.clear()
+        self._polls += 1
+
+        # Users are the top-level virtual folders (delimiter listing, no full scan)
+        usernames = [item.name.rstrip('/') for item in container.walk_blobs(delimiter='/')
+                     if isinstance(item, BlobPrefix)]
+
+        # List only {user}/knowhow/ (skips the per-page JSON blobs that make up
+        # most of the container). The whole prefix is still listed every poll;
+        # the watermark only skips re-inserting PDFs already seen. Blobs stamped
+        # in the watermark's own second are re-inserted (last_modified has 1s
+        # resolution, so a same-second upload could land after the last listing)
+        watermark = self.last_seen_ts
+        newest = watermark
+        for username in usernames:
+            if resync:
+                # One delimiter level under json/, without walking the per-page blobs.
+                # Only legacy {base}.json files count here: a {base}/ folder gets page_N.json
+                # before meta.json, so an unfinished run is confirmed by _has_json instead
+                json_prefix = f"{username}/json/"
+                for item in container.walk_blobs(name_starts_with=json_prefix, delimiter='/',
+                                                 results_per_page=self.LIST_PAGE_SIZE):
+                    name = item.name[len(json_prefix):]
+                    if not isinstance(item, BlobPrefix) and name.lower().endswith('.json'):
+                        self._jsons.add((username, name[:-5]))
+            knowhow_prefix = f"{username}/knowhow/"
+            prefix_len = len(knowhow_prefix)
+            for blob in container.list_blobs(name_starts_with=knowhow_prefix,
+                                             results_per_page=self.LIST_PAGE_SIZE):
+                modified = blob.last_modified
+                if watermark and modified and modified < watermark:
+                    continue
+                if modified and (newest is None or modified > newest):
+                    newest = modified
+                # Prefix is known, so the filename is a slice (no split); skip subfolders
+                filename = blob.name[prefix_len:]
+                if '/' not in filename and filename.lower().endswith('.pdf'):
+                    self._pdfs[(username, filename[:-4])] = blob.name  # key: base name without .pdf
+        self.last_seen_ts = newest
+
+        # Find PDFs without JSON. Keys only enter _jsons once a legacy {base}.json or
+        # {base}/meta.json is seen, so a crashed or running split-format analysis is
+        # re-checked (and retried per its status) instead of being treated as done.
+        for key in [k for k in self._pdfs if k not in self._jsons]:
+            await self._check_pdf(container, key)
+
+    async def handle_blob_created(self, blob_name: str) -> bool:
+        """
+        Push path (Event Grid BlobCreated): register a new {user}/knowhow/{file}.pdf
+        and run the same JSON/status checks as a poll. Returns False for blobs
+        outside the watched layout.
+        """
+        username, _, rest = blob_name.partition('/')
+        folder, _, filename = rest.partition('/')
+        if not username or folder != 'knowhow' or '/' in filename or not filename.lower().endswith('.pdf'):
+            return False
+
+        key = (username, filename[:-4])
+        self._pdfs[key] = blob_name
+        self._jsons.discard(key)  # a re-upload gets re-checked
+        await self._check_pdf(get_container_client(), key)
+        return True
+
+    async def _check_pdf(self, container: ContainerClient, key: Tuple[str, str]):
+        """Trigger analysis for one indexed PDF unless it has JSON, is gone, or is already handled."""
+        username, base_name = key
+        pdf_blob = self._pdfs.get(key)
+        if pdf_blob is None:
+            return  # dropped (e.g. by handle_blob_created) while an earlier check was awaited
+        pdf_filename = os.path.basename(pdf_blob)
+
+        # Check if JSON exists
+        if self._has_json(container, username, base_name):
+            self._jsons.add(key)
+            return
+
+        # Deleted before it was analyzed
+        if not container.get_blob_client(pdf_blob).exists():
+            self._pdfs.pop(key, None)
+            return
+
+        # Check if already processing
+        if pdf_blob in self.processing:
+            return
+
+        # Check status - don't re-trigger if in progress or failed
+        status = status_manager.get_status(pdf_filename, username=username)
+        if status:
+            state = status.get('status', '')
+            if state in ['in_progress', 'retrying', 'finalizing']:
+                logger.info("[BlobMonitor] Skipping %s - already %s", pdf_filename, state)
+                return
+            elif state == 'failed':
+                retry_count = status.get('retry_count', 0)
+                if retry_count >= 3:
+                    logger.info("[BlobMonitor] Skipping %s - max retries exceeded", pdf_filename)
+                    return
+
+        # New file found - trigger analysis
+        logger.info("[BlobMonitor] Found new PDF without JSON: %s", pdf_blob)
+        await self.trigger_analysis(pdf_blob, username)
 
     async def trigger_analysis(self, blob_name: str, username: str):
         """Trigger DI analysis for a new file"""
@@ -119,7 +223,7 @@ class BlobMonitor:
             filename = os.path.basename(blob_name)
             self.processing.add(blob_name)
 
-            print(f"[BlobMonitor] Triggering analysis for {filename}...")
+            logger.info("[BlobMonitor] Triggering analysis for %s...", filename)
 
             # H3 FIX: Get actual page count from PDF instead of hardcoding 100
             container = get_container_client()
@@ -127,17 +231,15 @@ class BlobMonitor:
 
             total_pages = 0
             try:
-                pdf_data = blob_client.download_blob().readall()
-                total_pages = _count_pdf_pages(pdf_data)
-                del pdf_data  # Free memory
-                print(f"[BlobMonitor] Detected {total_pages} pages in {filename}")
+                total_pages = await asyncio.to_thread(_count_blob_pdf_pages, blob_client)
+                logger.info("[BlobMonitor] Detected %s pages in %s", total_pages, filename)
             except Exception as e:
-                print(f"[BlobMonitor] Failed to detect page count for {filename}: {e}")
+                logger.warning("[BlobMonitor] Failed to detect page count for %s: %s", filename, e)
 
             if total_pages <= 0:
                 # Fallback: use a generous estimate to avoid missing pages
                 total_pages = 500
-                print(f"[BlobMonitor] Using fallback page count: {total_pages}")
+                logger.info("[BlobMonitor] Using fallback page count: %s", total_pages)
 
             # Initialize status (with username scope)
             status_manager.init_status(filename, total_pages, 'knowhow', username=username)
@@ -151,12 +253,10 @@ class BlobMonitor:
                 username=username
             )
 
-            print(f"[BlobMonitor] Analysis completed for {filename}")
+            logger.info("[BlobMonitor] Analysis completed for %s", filename)
 
         except Exception as e:
-            print(f"[BlobMonitor] Failed to trigger analysis for {blob_name}: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("[BlobMonitor] Failed to trigger analysis for %s: %s", blob_name, e)
         finally:
             self.processing.discard(blob_name)
 
@@ -1,13 +1,61 @@
 from fastapi import HTTPException
 from app.core.config import settings
 from azure.storage.blob import BlobServiceClient
+from functools import lru_cache
 import logging
+import threading
 
 # Initialize logger
 logger = logging.getLogger(__name__)
 
 # Global singleton instance
 _blob_service_client = None
+_client_lock = threading.Lock()
+# Set by the background SAS probe when the token is rejected; later builds go
+# straight to the connection string
+_sas_auth_failed = False
+
+
+def _probe_sas_client(sas_client, fallback_client):
+    """
+    Verify SAS auth off the request path. Requests in the meantime use
+    fallback_client (connection string, when configured); on success the
+    singleton switches to the SAS client, on failure it stays on the fallback.
+    """
+    global _blob_service_client, _sas_auth_failed
+    try:
+        sas_client.get_account_information()
+        print("SAS Token auth verified (background probe)")
+    except Exception as e:
+        print(f"Warning: SAS Token auth failed ({type(e).__name__}: {e})")
+        if fallback_client is not None:
+            print("Keeping blob client on connection string.")
+            _sas_auth_failed = True
+        return  # without a fallback the SAS client stays; operations surface the error
+
+    if fallback_client is None:
+        return
+    with _client_lock:
+        if _blob_service_client is fallback_client:
+            _blob_service_client = sas_client
+            get_container_client.cache_clear()
+
+def _connection_string_client():
+    """BlobServiceClient from AZURE_BLOB_CONNECTION_STRING, or None."""
+    if not settings.AZURE_BLOB_CONNECTION_STRING:
+        return None
+    # Check basic validity markers
+    conn_str = settings.AZURE_BLOB_CONNECTION_STRING.strip()
+    if "DefaultEndpointsProtocol" in conn_str or "SharedAccessSignature" in conn_str:
+        try:
+            # Debug log (masked)
+            print(f"DEBUG: Attempting Connection String (Length: {len(conn_str)})")
+            client = BlobServiceClient.from_connection_string(conn_str)
+            print("Successfully authenticated with Connection String (Singleton initialized)")
+            return client
+        except Exception as e:
+            print(f"Warning: Connection string failed ({e})")
+    return None
 
 def get_blob_service_client():
     """
@@ -23,57 +71,46 @@ def get_blob_service_client():
     if not settings.AZURE_BLOB_CONNECTION_STRING and not (settings.AZURE_STORAGE_ACCOUNT_NAME and settings.AZURE_BLOB_SAS_TOKEN):
         logger.error("Azure Storage not configured")
         raise HTTPException(status_code=500, detail="Azure Storage not configured")
-    
-    client = None
-    
-    # Method 1: Try Explicit Account Name + SAS Token (Preferred)
-    if not client and settings.AZURE_STORAGE_ACCOUNT_NAME and settings.AZURE_BLOB_SAS_TOKEN:
-        try:
-            sas_token = _clean_sas_token(settings.AZURE_BLOB_SAS_TOKEN)
-            
-            account_url = f"https://{settings.AZURE_STORAGE_ACCOUNT_NAME}.blob.core.windows.net"
-            temp_client = BlobServiceClient(account_url, credential=sas_token)
-            
-            # Verify authentication immediately (Fail Fast) - Only needed on first creation
-            temp_client.get_account_information()
-            
-            client = temp_client
-            print("Successfully authenticated with SAS Token (Singleton initialized)")
-            
-        except Exception as e:
-            print(f"Warning: SAS Token auth failed ({type(e).__name__}: {e}), trying connection string.")
-            client = None
-
-    # Method 2: Fallback to Connection String
-    if not client and settings.AZURE_BLOB_CONNECTION_STRING:
-        # Check basic validity markers
-        conn_str = settings.AZURE_BLOB_CONNECTION_STRING.strip()
-        if "DefaultEndpointsProtocol" in conn_str or "SharedAccessSignature" in conn_str:
+
+    with _client_lock:
+        if _blob_service_client:
+            return _blob_service_client
+
+        sas_client = None
+        # Method 1: Explicit Account Name + SAS Token (Preferred)
+        if not _sas_auth_failed and settings.AZURE_STORAGE_ACCOUNT_NAME and settings.AZURE_BLOB_SAS_TOKEN:
             try:
-                # Debug log (masked)
-                print(f"DEBUG: Attempting Connection String (Length: {len(conn_str)})")
-                temp_client = BlobServiceClient.from_connection_string(conn_str)
-                
-                # OPTIONAL: Verify connection string auth too?
-                # temp_client.get_account_information() 
-                
-                client = temp_client
-                print("Successfully authenticated with Connection String (Singleton initialized)")
+                sas_token = _clean_sas_token(settings.AZURE_BLOB_SAS_TOKEN)
+                account_url = f"https://{settings.AZURE_STORAGE_ACCOUNT_NAME}.blob.core.windows.net"
+                sas_client = BlobServiceClient(account_url, credential=sas_token)
+                print("Created blob client with SAS Token")
             except Exception as e:
-                print(f"Warning: Connection string failed ({e})")
-                client = None
-            
-    if not client:
-        raise HTTPException(status_code=500, detail="Could not create Azure Blob Client (Auth Failed)")
-        
-    # Assign to global singleton
-    _blob_service_client = client
-    return _blob_service_client
+                print(f"Warning: SAS Token auth failed ({type(e).__name__}: {e}), trying connection string.")
+                sas_client = None
+
+        # Method 2: Connection String - the client outright, or the fallback while SAS is unverified
+        conn_client = _connection_string_client()
+
+        client = conn_client or sas_client
+        if not client:
+            raise HTTPException(status_code=500, detail="Could not create Azure Blob Client (Auth Failed)")
+
+        # Assign to global singleton before the probe can run
+        _blob_service_client = client
+
+    if sas_client is not None:
+        # Verify SAS in the background so the first request isn't blocked on the
+        # round-trip (also warms the connection)
+        threading.Thread(target=_probe_sas_client, args=(sas_client, conn_client), daemon=True).start()
+    return client
 
+@lru_cache(maxsize=8)
 def get_container_client(container_name: str = None):
     """
     Helper to get the container client using the singleton service client.
     Allows overriding container_name, defaults to settings.
+    Cached per container name; ContainerClient is thread-safe and shares the
+    service client's connection pool.
     """
     client = get_blob_service_client()
     
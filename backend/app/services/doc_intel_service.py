@@ -4,12 +4,131 @@ Extracted from working Streamlit implementation.
 Handles PDF analysis using Azure Document Intelligence.
 """
 
-from azure.ai.documentintelligence import DocumentIntelligenceClient
-from azure.ai.documentintelligence.models import AnalyzeDocumentRequest, DocumentAnalysisFeature
-from azure.core.credentials import AzureKeyCredential
-from azure.core.exceptions import HttpResponseError
-from typing import List, Dict, Any
+# Azure SDK imports are deferred to the methods that use them: render pool workers
+# import this module for _render_page_to_jpeg and never touch the azure-core stack.
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait as wait_futures
+from functools import lru_cache
+from typing import List, Dict, Any, Tuple
+import asyncio
+import itertools
 import os
+import tempfile
+import threading
+
+import numpy as np
+
+
+def _parse_page_range(page_range) -> List[int]:
+    """
+    '1-5', '1,3,5', '7' or mixed '1-3,7' → sorted unique 1-based page numbers.
+    A list/tuple of page numbers (already parsed) passes through, so callers parse once.
+    """
+    if isinstance(page_range, (list, tuple)):
+        return sorted(set(page_range))
+    return list(_parse_page_range_str(str(page_range)))
+
+
+@lru_cache(maxsize=256)
+def _parse_page_range_str(page_range: str) -> Tuple[int, ...]:
+    """Memoized parse: the same chunk ranges ('1-50', '51-100', ...) recur for every document."""
+    pages = set()
+    for part in page_range.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, end = map(int, part.split('-', 1))
+            pages.update(range(start, end + 1))
+        else:
+            pages.add(int(part))
+    return tuple(sorted(pages))
+
+
+def _calc_render_scale(width: float, height: float, dpi: int, max_dimension: int) -> float:
+    """
+    Render scale for a page of width x height points.
+    Default 72 DPI. Target 150 DPI = 2.08x, but check dimension limit (3000px).
+    """
+    scale = dpi / 72.0
+    if width * scale > max_dimension or height * scale > max_dimension:
+        scale = min(max_dimension / width, max_dimension / height)
+    return scale
+
+
+# (connect, read) seconds for blob downloads
+DOWNLOAD_TIMEOUT = (5, 120)
+
+
+@lru_cache(maxsize=1)
+def _download_session():
+    """
+    Process-wide keep-alive session for blob downloads: skips a TLS handshake per
+    download and retries transient 429/5xx (and connection resets) with backoff.
+    Pool covers the parallel Range workers.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=frozenset({"GET", "HEAD"})
+    )
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=retry))
+    return session
+
+
+_render_pool_lock = threading.Lock()
+_render_pool_executor = None
+
+
+def _render_pool() -> ProcessPoolExecutor:
+    """
+    Process-wide render pool, created once and reused by every request. Workers come
+    from a forkserver, not fork(): the server process runs logging, event-loop and
+    to_thread threads, and forking a threaded process can deadlock the child.
+    """
+    import multiprocessing
+
+    global _render_pool_executor
+    with _render_pool_lock:
+        # A worker killed mid-render (e.g. OOM) breaks the executor for good: replace it
+        if _render_pool_executor is None or getattr(_render_pool_executor, "_broken", False):
+            _render_pool_executor = ProcessPoolExecutor(
+                max_workers=os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context("forkserver"),
+            )
+        return _render_pool_executor
+
+
+def _render_page_to_jpeg(args) -> Tuple[int, int, bytes]:
+    """
+    Process-pool worker: render one page of the PDF at pdf_path to JPEG bytes.
+    args = (pdf_path, p_idx, dpi, max_dimension, quality, colorspace); returns (width, height, jpeg_bytes).
+    colorspace "gray" renders GRAY8 (1/3 the pixmap and ~1/3 the JPEG of RGB for line art).
+    """
+    import fitz
+
+    pdf_path, p_idx, dpi, max_dimension, quality, colorspace = args
+    # Opened per task: workers outlive the request, and a cached handle would keep the
+    # deleted temp PDF alive (in memory, on Cloud Run's tmpfs) in every idle worker
+    with fitz.open(pdf_path) as doc:
+        page = doc.load_page(p_idx)
+        rect = page.rect
+        scale = _calc_render_scale(rect.width, rect.height, dpi, max_dimension)
+        mat = fitz.Matrix(scale, scale)
+        pix = page.get_pixmap(matrix=mat, colorspace=fitz.csGRAY if colorspace == "gray" else fitz.csRGB, alpha=False)
+        page = None
+
+    # [High Accuracy] Keep RGB, Quality 85 by default (encoded by MuPDF's libjpeg, no PIL copy)
+    img_bytes = pix.tobytes("jpeg", jpg_quality=quality)
+    width, height = pix.width, pix.height
+    pix = None  # free samples before the bytes are pickled back to the parent
+    return width, height, img_bytes
 
 
 class DocumentIntelligenceService:
@@ -24,6 +143,8 @@ class DocumentIntelligenceService:
             key: Azure DI key (defaults to env var)
         """
         from app.core.config import settings
+        from azure.ai.documentintelligence import DocumentIntelligenceClient
+        from azure.core.credentials import AzureKeyCredential
         
         self.endpoint = endpoint or settings.AZURE_DOC_INTEL_ENDPOINT
         self.key = key or settings.AZURE_DOC_INTEL_KEY
@@ -33,14 +154,96 @@ class DocumentIntelligenceService:
         
         self.client = DocumentIntelligenceClient(
             endpoint=self.endpoint,
-            credential=AzureKeyCredential(self.key)
+            credential=AzureKeyCredential(self.key),
+            retry_total=3,
+            retry_backoff_factor=0.5
         )
+        # aio clients and aiohttp sessions are bound to the loop that first uses them:
+        # one long-lived (client, session) pair per loop (the app's loop, plus
+        # _sync_loop for the sync wrappers)
+        # (a plain dict: the session references its loop, so weak keys would never drop)
+        self._aio_clients = {}
+        self._sync_loop_lock = threading.Lock()
+        self._sync_event_loop = None
     
+    # Connections kept per loop's aiohttp session, shared by DI polling and blob
+    # HEAD/downloads; rendered-page and sharded jobs poll DI in parallel and would
+    # otherwise redo TLS handshakes
+    HTTP_POOL_SIZE = 64
+
+    def _aio_state(self):
+        """(aio DocumentIntelligenceClient, pooled aiohttp session) for the running loop."""
+        import aiohttp
+        from azure.ai.documentintelligence.aio import DocumentIntelligenceClient as AsyncDocumentIntelligenceClient
+        from azure.core.credentials import AzureKeyCredential
+        from azure.core.pipeline.transport import AioHttpTransport
+
+        loop = asyncio.get_running_loop()
+        state = self._aio_clients.get(loop)
+        if state is None:
+            session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.HTTP_POOL_SIZE))
+            client = AsyncDocumentIntelligenceClient(
+                endpoint=self.endpoint,
+                credential=AzureKeyCredential(self.key),
+                transport=AioHttpTransport(session=session, session_owner=False),
+                retry_total=3,
+                retry_backoff_factor=0.5
+            )
+            state = self._aio_clients[loop] = (client, session)
+        return state
+
+    def _aio_client(self):
+        """Long-lived aio DocumentIntelligenceClient for the running event loop."""
+        return self._aio_state()[0]
+
+    async def _close_aio_state(self):
+        """Close the running loop's aio client and pooled session, if any."""
+        state = self._aio_clients.pop(asyncio.get_running_loop(), None)
+        if state is not None:
+            client, session = state
+            await client.close()
+            await session.close()
+
+    async def aclose(self):
+        """Close aio clients/sessions on the app's loop and on _sync_loop (app shutdown)."""
+        await self._close_aio_state()
+        with self._sync_loop_lock:
+            loop, self._sync_event_loop = self._sync_event_loop, None
+        if loop is not None:
+            await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._close_aio_state(), loop))
+            loop.call_soon_threadsafe(loop.stop)
+
+    def _sync_loop(self):
+        """Background event loop thread that runs the sync wrappers' coroutines."""
+        with self._sync_loop_lock:
+            if self._sync_event_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="doc-intel-sync", daemon=True).start()
+                self._sync_event_loop = loop
+            return self._sync_event_loop
+
+    def _run_sync(self, coro):
+        """
+        Run coro for a sync caller on _sync_loop, so its aio client (and connections)
+        persist across calls. Inside a running event loop this would block the loop:
+        raise and point at the *_async method instead.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run_coroutine_threadsafe(coro, self._sync_loop()).result()
+        coro.close()
+        raise RuntimeError(
+            f"{coro.__qualname__.removesuffix('_async')}() called from a running event loop; "
+            f"await {coro.__qualname__}() instead"
+        )
+
     def analyze_document(
         self, 
         blob_url: str, 
         page_range: str = None, 
-        high_res: bool = False
+        high_res: bool = False,
+        polling_interval: float = 1.0
     ) -> List[Dict[str, Any]]:
         """
         Analyze document from Blob Storage URL.
@@ -49,7 +252,11 @@ class DocumentIntelligenceService:
             blob_url: SAS URL to the blob (must include read permissions)
             page_range: Page range to analyze (e.g., "1-10") or None for all pages
             high_res: Whether to use high-resolution OCR (slower but more accurate)
+            polling_interval: LRO poll delay in seconds when DI sends no Retry-After
         """
+        from azure.ai.documentintelligence.models import AnalyzeDocumentRequest, DocumentAnalysisFeature
+        from azure.core.exceptions import HttpResponseError
+
         try:
             print(f"[DI] Starting analysis: pages={page_range}, high_res={high_res}")
             
@@ -58,28 +265,20 @@ class DocumentIntelligenceService:
             if high_res:
                 features.append(DocumentAnalysisFeature.OCR_HIGH_RESOLUTION)
             
-            # Create request object correctly
-            analyze_request = AnalyzeDocumentRequest(url_source=blob_url)
-            
-            # Start analysis with correct keyword arguments
             poller = self.client.begin_analyze_document(
                 model_id="prebuilt-layout",
-                analyze_request=analyze_request,   # CORRECTED: use analyze_request kwarg, not body
+                analyze_request=AnalyzeDocumentRequest(url_source=blob_url),
                 features=features,
-                pages=page_range if page_range else None
+                pages=page_range if page_range else None,
+                # SDK default is 5s, which dominates latency for small ranges
+                polling_interval=polling_interval
             )
             
             # Wait for completion
             result = poller.result()
             print(f"[DI] Analysis complete: {len(result.pages)} pages processed")
             
-            # Extract page chunks
-            page_chunks = []
-            for page in result.pages:
-                chunk = self._extract_page_content(page, result)
-                page_chunks.append(chunk)
-            
-            return page_chunks
+            return self._extract_results([result])
             
         except HttpResponseError as e:
             # Detailed Logging for Debugging
@@ -99,94 +298,219 @@ class DocumentIntelligenceService:
             print(f"[DI] Analysis failed: {e}")
             raise
 
-    def create_optimized_pdf_bytes(self, blob_url: str, page_range: str, dpi: int = 150, max_dimension: int = 3000) -> bytes:
+    # Streamed download chunk size (8 KiB chunks cost ~128x more read/write calls)
+    DOWNLOAD_CHUNK_SIZE = 1 << 20
+    # Large blobs are fetched as parallel HTTP Range parts written at their offsets;
+    # one connection is capped by per-connection TLS throughput, well below the blob limit
+    RANGE_PART_SIZE = 8 << 20
+    RANGE_WORKERS = 8
+
+    def _ranged_size(self, status: int, headers) -> int:
+        """Blob size if a HEAD response allows a parallel ranged download, else None."""
+        if status != 200 or headers.get("Accept-Ranges") != "bytes" or not hasattr(os, "pwrite"):
+            return None
+        size = int(headers.get("Content-Length") or 0)
+        return size if size >= 2 * self.RANGE_PART_SIZE else None
+
+    def _byte_ranges(self, size: int) -> List[Tuple[int, int]]:
+        """Inclusive (start, end) Range pairs covering size bytes."""
+        return [(start, min(start + self.RANGE_PART_SIZE, size) - 1) for start in range(0, size, self.RANGE_PART_SIZE)]
+
+    def _download_pdf(self, blob_url: str) -> str:
+        """Stream blob_url into a temp .pdf file and return its path (caller removes it)."""
+        from concurrent.futures import ThreadPoolExecutor
+
+        session = _download_session()
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
+            try:
+                head = session.head(blob_url, timeout=DOWNLOAD_TIMEOUT)
+                size = self._ranged_size(head.status_code, head.headers)
+                if size:
+                    tmp_file.truncate(size)
+                    fd = tmp_file.fileno()
+
+                    def _fetch(part):
+                        start, end = part
+                        with session.get(blob_url, headers={"Range": f"bytes={start}-{end}"}, stream=True, timeout=DOWNLOAD_TIMEOUT) as r:
+                            if r.status_code != 206:
+                                raise IOError(f"Ranged download of bytes {start}-{end} returned HTTP {r.status_code}")
+                            offset = start
+                            for chunk in r.iter_content(chunk_size=self.DOWNLOAD_CHUNK_SIZE):
+                                os.pwrite(fd, chunk, offset)
+                                offset += len(chunk)
+
+                    with ThreadPoolExecutor(max_workers=self.RANGE_WORKERS) as ex:
+                        list(ex.map(_fetch, self._byte_ranges(size)))
+                else:
+                    with session.get(blob_url, stream=True, timeout=DOWNLOAD_TIMEOUT) as r:
+                        r.raise_for_status()
+                        for chunk in r.iter_content(chunk_size=self.DOWNLOAD_CHUNK_SIZE):
+                            tmp_file.write(chunk)
+            except Exception:
+                tmp_file.close()
+                os.remove(tmp_file.name)
+                raise
+        return tmp_file.name
+
+    async def _download_pdf_async(self, blob_url: str) -> str:
+        """
+        aiohttp variant of _download_pdf over the loop's pooled session;
+        the event loop stays free while bytes arrive.
+        """
+        session = self._aio_state()[1]
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
+            try:
+                async with session.head(blob_url) as head:
+                    size = self._ranged_size(head.status, head.headers)
+                if size:
+                    tmp_file.truncate(size)
+                    fd = tmp_file.fileno()
+                    semaphore = asyncio.Semaphore(self.RANGE_WORKERS)
+
+                    async def _fetch(start, end):
+                        async with semaphore:
+                            async with session.get(blob_url, headers={"Range": f"bytes={start}-{end}"}) as r:
+                                if r.status != 206:
+                                    raise IOError(f"Ranged download of bytes {start}-{end} returned HTTP {r.status}")
+                                offset = start
+                                async for chunk in r.content.iter_chunked(self.DOWNLOAD_CHUNK_SIZE):
+                                    os.pwrite(fd, chunk, offset)
+                                    offset += len(chunk)
+
+                    await asyncio.gather(*(_fetch(start, end) for start, end in self._byte_ranges(size)))
+                else:
+                    async with session.get(blob_url) as r:
+                        r.raise_for_status()
+                        async for chunk in r.content.iter_chunked(self.DOWNLOAD_CHUNK_SIZE):
+                            tmp_file.write(chunk)
+            except Exception:
+                tmp_file.close()
+                os.remove(tmp_file.name)
+                raise
+        return tmp_file.name
+
+    # Render ladder floors when a target_bytes budget forces lower settings
+    RENDER_QUALITY = 85
+    RENDER_MIN_DPI = 72
+    RENDER_MIN_QUALITY = 40
+
+    def create_optimized_pdf_bytes(self, blob_url: str, page_range: str, dpi: int = 150, max_dimension: int = 3000, target_bytes: int = None, colorspace: str = "rgb") -> bytes:
         """
         Downloads PDF to temp file, renders requested pages as images (High Quality), and creates a new PDF.
         Returns the bytes of the new PDF.
+        target_bytes: optional output size budget (e.g. 3_500_000 for DI's 4 MB free-tier limit);
+        remaining pages are rendered at lower DPI/quality when the first page projects over it.
+        colorspace: "rgb" (default, keeps colour-coded lines) or "gray" for monochrome P&IDs.
+        """
+        print(f"[HighQualityFallback] Downloading PDF from URL to temp file...")
+        tmp_path = self._download_pdf(blob_url)
+        try:
+            return self._render_optimized_pdf(tmp_path, page_range, dpi, max_dimension, target_bytes, colorspace)
+        finally:
+            self._remove_temp_pdf(tmp_path)
+
+    async def create_optimized_pdf_bytes_async(self, blob_url: str, page_range: str, dpi: int = 150, max_dimension: int = 3000, target_bytes: int = None, colorspace: str = "rgb") -> bytes:
+        """
+        Async create_optimized_pdf_bytes: aiohttp download, rendering in a worker thread
+        so other requests keep running while a large drawing downloads and renders.
         """
-        import requests
+        print(f"[HighQualityFallback] Downloading PDF from URL to temp file (async)...")
+        tmp_path = await self._download_pdf_async(blob_url)
+        try:
+            return await asyncio.to_thread(self._render_optimized_pdf, tmp_path, page_range, dpi, max_dimension, target_bytes, colorspace)
+        finally:
+            self._remove_temp_pdf(tmp_path)
+
+    def _remove_temp_pdf(self, tmp_path: str):
+        if tmp_path and os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+                print(f"[Fallback] Cleaned up temp file")
+            except:
+                pass
+
+    def _fit_render_budget(self, first_page_bytes: int, page_count: int, target_bytes: int, dpi: int) -> Tuple[float, int]:
+        """
+        Pick (dpi, quality) for the remaining pages from the first page's measured size.
+        JPEG size scales roughly with pixel area (dpi²), so DPI drops by sqrt(budget / size);
+        quality only drops once DPI hits its floor. Never raises settings above the request.
+        """
+        budget = target_bytes / page_count
+        factor = (budget / max(first_page_bytes, 1)) ** 0.5
+        if factor >= 1:
+            return dpi, self.RENDER_QUALITY
+
+        scaled_dpi = dpi * factor
+        if scaled_dpi >= self.RENDER_MIN_DPI:
+            return scaled_dpi, self.RENDER_QUALITY
+        shortfall = scaled_dpi / self.RENDER_MIN_DPI
+        return self.RENDER_MIN_DPI, max(self.RENDER_MIN_QUALITY, int(self.RENDER_QUALITY * shortfall))
+
+    def _render_optimized_pdf(self, tmp_path: str, page_range: str, dpi: int, max_dimension: int, target_bytes: int = None, colorspace: str = "rgb") -> bytes:
+        """Render the requested pages of a downloaded PDF as JPEG pages of a new PDF."""
         import fitz # PyMuPDF
-        import io
-        import tempfile
-        import os
-        from PIL import Image
 
-        print(f"[HighQualityFallback] Downloading PDF from URL to temp file...")
-        
-        tmp_path = None
         try:
-            # 1. Download original PDF to Temp File (Streamed)
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-                tmp_path = tmp_file.name
-                with requests.get(blob_url, stream=True) as r:
-                    r.raise_for_status()
-                    for chunk in r.iter_content(chunk_size=8192):
-                        tmp_file.write(chunk)
-            
             print(f"[HighQualityFallback] Downloaded to {tmp_path} ({os.path.getsize(tmp_path)/1024/1024:.2f} MB)")
 
             # Open from disk
             doc = fitz.open(tmp_path)
             new_doc = fitz.open() # output PDF
             
-            # 2. Parse Page Range
-            # format: "1-5", "1,3,5" or None
-            target_pages = []
+            # 2. Parse Page Range (0-indexed)
+            # format: "1-5", "1,3,5", an already-parsed page list, or None
             if not page_range:
                 target_pages = range(len(doc))
-            elif "-" in str(page_range):
-                start, end = map(int, str(page_range).split('-'))
-                target_pages = range(start - 1, end) # 0-indexed
             else:
-                # Handle "1" or "1,2"
-                parts = str(page_range).split(',')
-                for p in parts:
-                    target_pages.append(int(p) - 1)
+                target_pages = [p - 1 for p in _parse_page_range(page_range)]
+            
+            # Cull out-of-range indices once with a mask instead of a per-page bounds check
+            tp = np.asarray(target_pages, dtype=np.int32)
+            target_pages = tp[(tp >= 0) & (tp < len(doc))].tolist()
             
             print(f"[HighQualityFallback] Processing {len(target_pages)} pages (High Quality)...")
 
-            # 3. Render and Add
-            for i, p_idx in enumerate(target_pages):
-                if p_idx < 0 or p_idx >= len(doc): continue
-                
-                # Log progress every 5 pages
-                if i % 5 == 0:
-                    print(f"[HighQualityFallback] Optimizing page {p_idx+1} ({i+1}/{len(target_pages)})")
+            # 3. Render in the shared process pool (CPU-bound; workers reopen the temp file), add serially
+            ex = _render_pool()
+            futures = []
+            try:
+                rest_dpi, rest_quality = dpi, self.RENDER_QUALITY
+                rendered = []
+                if target_bytes and len(target_pages) > 1:
+                    # Ladder: measure the first page at full settings, size the rest to the budget
+                    first = ex.submit(_render_page_to_jpeg, (tmp_path, target_pages[0], dpi, max_dimension, self.RENDER_QUALITY, colorspace)).result()
+                    rendered = [first]
+                    rest_dpi, rest_quality = self._fit_render_budget(len(first[2]), len(target_pages), target_bytes, dpi)
+                    print(f"[HighQualityFallback] Page {target_pages[0]+1} = {len(first[2])/1024:.0f}KB; rendering rest at dpi={rest_dpi:.0f}, quality={rest_quality}")
 
-                page = doc.load_page(p_idx)
-                
-                # Calculate resize scale
-                # Default 72 DPI. Target 150 DPI = 2.08x
-                # But check dimension limit (3000px)
-                rect = page.rect
-                scale = dpi / 72.0
-                
-                if rect.width * scale > max_dimension or rect.height * scale > max_dimension:
-                    scale = min(max_dimension / rect.width, max_dimension / rect.height)
-                    
-                mat = fitz.Matrix(scale, scale)
-                pix = page.get_pixmap(matrix=mat)
-                
-                # Convert to PIL for easy JPEG compression (strip alpha to save space)
-                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                
-                # [High Accuracy] Keep RGB, Quality 85
-                
-                # Save to JPEG bytes
-                img_bio = io.BytesIO()
-                img.save(img_bio, format="JPEG", quality=85, optimize=True)
-                img_bytes = img_bio.getvalue()
-                
-                # Create new PDF page from image
-                img_page = new_doc.new_page(width=pix.width, height=pix.height)
-                img_page.insert_image(img_page.rect, stream=img_bytes)
+                args = [(tmp_path, p_idx, rest_dpi, max_dimension, rest_quality, colorspace) for p_idx in target_pages[len(rendered):]]
+                futures = [ex.submit(_render_page_to_jpeg, a) for a in args]
+                rendered = itertools.chain(rendered, (f.result() for f in futures))
+                for i, (p_idx, (width, height, img_bytes)) in enumerate(zip(target_pages, rendered)):
+                    # Log progress every 5 pages
+                    if i % 5 == 0:
+                        print(f"[HighQualityFallback] Optimizing page {p_idx+1} ({i+1}/{len(target_pages)})")
+
+                    # Create new PDF page from image
+                    img_page = new_doc.new_page(width=width, height=height)
+                    img_page.insert_image(img_page.rect, stream=img_bytes)
+            finally:
+                # The pool outlives this call: drop queued renders of a failed run and let
+                # running ones finish before the caller removes tmp_path
+                for f in futures:
+                    f.cancel()
+                wait_futures(futures)
                 
             # 4. Save
+            # Saved to disk and read back once: a BytesIO would hold the PDF twice
+            # (internal buffer + getvalue() copy) at peak
             print(f"[Fallback] Rebuilding final PDF...")
-            output_bio = io.BytesIO()
-            new_doc.save(output_bio)
+            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as out_file:
+                out_path = out_file.name
+            new_doc.save(out_path, garbage=4, deflate=True)  # compact xref, compress non-image streams
             
-            final_bytes = output_bio.getvalue()
+            with open(out_path, "rb") as f:
+                final_bytes = f.read()
             print(f"[Fallback] Optimized PDF size: {len(final_bytes)/1024/1024:.2f} MB")
             return final_bytes
             
@@ -194,64 +518,79 @@ class DocumentIntelligenceService:
             print(f"[Fallback] Error optimizing PDF: {e}")
             raise e
         finally:
-            # Cleanup temp file
-            if tmp_path and os.path.exists(tmp_path):
-                try:
-                    os.remove(tmp_path)
-                    print(f"[Fallback] Cleaned up temp file")
-                except:
-                    pass
             if 'doc' in locals(): doc.close()
             if 'new_doc' in locals(): new_doc.close()
+            if 'out_path' in locals():
+                self._remove_temp_pdf(out_path)
+
+    # Same threshold/pool size as AzureDIService's page formatting
+    PARALLEL_EXTRACT_MIN_PAGES = 5
+    EXTRACT_WORKERS = 4
 
-    def _extract_page_content(self, page: Any, full_result: Any) -> Dict[str, Any]:
+    def _extract_results(self, results: List[Any]) -> List[Dict[str, Any]]:
+        """Page chunks for all shard results, in page order (tables are bucketed per shard result)."""
+        work = []
+        for result in results:
+            tables_by_page = self._group_tables_by_page(result)
+            work.extend((page, tables_by_page.get(page.page_number, [])) for page in result.pages)
+
+        if len(work) > self.PARALLEL_EXTRACT_MIN_PAGES:
+            with ThreadPoolExecutor(max_workers=self.EXTRACT_WORKERS) as ex:
+                page_chunks = list(ex.map(lambda item: self._extract_page_content(*item), work))
+        else:
+            page_chunks = [self._extract_page_content(page, page_tables) for page, page_tables in work]
+        # Stitched shards must read in page order regardless of how DI listed them
+        page_chunks.sort(key=lambda c: c["page_number"])
+        return page_chunks
+
+    def _group_tables_by_page(self, result: Any) -> Dict[int, List[Any]]:
+        """Bucket result.tables by the page of their first bounding region (one pass per result)."""
+        tables_by_page = defaultdict(list)
+        for table in getattr(result, 'tables', None) or []:
+            if getattr(table, 'bounding_regions', None):
+                tables_by_page[table.bounding_regions[0].page_number].append(table)
+        return tables_by_page
+
+    def _extract_page_content(self, page: Any, page_tables: List[Any]) -> Dict[str, Any]:
         """
         Extract content including Polygons for Spatial Analysis.
+        page_tables: this page's tables, pre-bucketed by _group_tables_by_page.
         """
         page_num = page.page_number
         
         # 1. Extract text content with Geometry
-        lines_data = []
-        if hasattr(page, 'lines') and page.lines:
-            for line in page.lines:
-                lines_data.append({
-                    "text": line.content,
-                    "polygon": self._flatten_polygon(line.polygon),
-                    "confidence": line.confidence if hasattr(line, 'confidence') else 1.0
-                })
+        # Records stay plain dicts: they are JSON-serialized and consumers use .get("polygon") etc.
+        lines = getattr(page, 'lines', None) or []
+        line_texts = [line.content for line in lines]
+        lines_data = [
+            {
+                "text": text,
+                "polygon": polygon,
+                # DocumentLine carries no confidence in the 1.0 SDK models
+                "confidence": getattr(line, 'confidence', 1.0)
+            }
+            for line, text, polygon in zip(lines, line_texts, self._flatten_polygons([line.polygon for line in lines]))
+        ]
         
         # Words for finer granularity
-        words_data = []
-        if hasattr(page, 'words') and page.words:
-            for word in page.words:
-                words_data.append({
-                    "text": word.content,
-                    "polygon": self._flatten_polygon(word.polygon),
-                    "confidence": word.confidence if hasattr(word, 'confidence') else 1.0
-                })
+        words = getattr(page, 'words', None) or []
+        words_data = [
+            {"text": word.content, "polygon": polygon, "confidence": word.confidence}
+            for word, polygon in zip(words, self._flatten_polygons([word.polygon for word in words]))
+        ]
 
         # Barcodes
-        barcodes = []
-        if hasattr(page, 'barcodes') and page.barcodes:
-            for bc in page.barcodes:
-                barcodes.append({
-                    "kind": bc.kind,
-                    "value": bc.value,
-                    "polygon": bc.polygon,
-                    "confidence": bc.confidence
-                })
-
-        content = "\n".join([l["text"] for l in lines_data])
+        barcodes = [
+            {"kind": bc.kind, "value": bc.value, "polygon": bc.polygon, "confidence": bc.confidence}
+            for bc in getattr(page, 'barcodes', None) or []
+        ]
+
+        content = "\n".join(line_texts)
         
         # ... (Tables and KVs extraction - kept similar or simplified) ...
         # For P&ID, tables are less critical than topology, but we keep them.
         
-        tables = []
-        if hasattr(full_result, 'tables') and full_result.tables:
-            for table in full_result.tables:
-                 if hasattr(table, 'bounding_regions') and table.bounding_regions:
-                    if table.bounding_regions[0].page_number == page_num:
-                        tables.append(self._extract_table(table))
+        tables = [self._extract_table(table) for table in page_tables]
 
         # 4. Build chunk with Geometry
         chunk = {
@@ -284,16 +623,15 @@ class DocumentIntelligenceService:
         rows = []
         
         if hasattr(table, 'cells') and table.cells:
-            # Build 2D array
-            max_row = max(cell.row_index for cell in table.cells) + 1
-            max_col = max(cell.column_index for cell in table.cells) + 1
-            
-            grid = [['' for _ in range(max_col)] for _ in range(max_row)]
+            # Build 2D array (bounds and scatter in one vectorized pass)
+            cells = list(table.cells)
+            rows_i = np.fromiter((cell.row_index for cell in cells), dtype=np.int32, count=len(cells))
+            cols_i = np.fromiter((cell.column_index for cell in cells), dtype=np.int32, count=len(cells))
             
-            for cell in table.cells:
-                grid[cell.row_index][cell.column_index] = cell.content
+            grid = np.full((rows_i.max() + 1, cols_i.max() + 1), '', dtype=object)
+            grid[rows_i, cols_i] = [cell.content for cell in cells]
             
-            rows = grid
+            rows = grid.tolist()
         
         return {
             "row_count": table.row_count if hasattr(table, 'row_count') else len(rows),
@@ -304,17 +642,33 @@ class DocumentIntelligenceService:
         }
 
     def _extract_cells_with_polygons(self, table: Any) -> List[Dict[str, Any]]:
-        cells_data = []
-        if hasattr(table, 'cells') and table.cells:
-            for cell in table.cells:
-                cells_data.append({
-                    "content": cell.content,
-                    "row_index": cell.row_index,
-                    "column_index": cell.column_index,
-                    "kind": str(cell.kind) if hasattr(cell, 'kind') and cell.kind else "content",
-                    "polygon": self._flatten_polygon(cell.bounding_regions[0].polygon) if hasattr(cell, 'bounding_regions') and cell.bounding_regions else None
-                })
-        return cells_data
+        flatten = self._flatten_polygon
+        return [
+            {
+                "content": cell.content,
+                "row_index": cell.row_index,
+                "column_index": cell.column_index,
+                "kind": str(kind) if (kind := getattr(cell, 'kind', None)) else "content",
+                "polygon": flatten(regions[0].polygon) if (regions := getattr(cell, 'bounding_regions', None)) else None
+            }
+            for cell in getattr(table, 'cells', None) or []
+        ]
+
+    def _flatten_polygons(self, polygons: list) -> List[list]:
+        """
+        Batch _flatten_polygon for a page's lines/words. DI 1.0 polygons are flat float
+        lists of equal length, so one float64 array conversion type-checks them all in C
+        (instead of an isinstance scan per coordinate); anything else goes per item.
+        """
+        if not polygons:
+            return []
+        try:
+            arr = np.asarray(polygons, dtype=np.float64)
+            if arr.ndim == 2 and arr.shape[1] and not np.isnan(arr).any():
+                return arr.tolist()
+        except (TypeError, ValueError):
+            pass
+        return [self._flatten_polygon(polygon) for polygon in polygons]
 
     def _flatten_polygon(self, polygon) -> list:
         """
@@ -339,33 +693,51 @@ class DocumentIntelligenceService:
         return flat_list
 
 
+    # Rendered pages in flight at once (each page is its own DI job)
+    RENDER_DI_CONCURRENCY = 3
+
     def analyze_via_rendering(
         self, 
         blob_url: str = None,
         local_file_path: str = None,
         page_range: str = None, 
         dpi: int = 150, 
-        max_dimension: int = 3000
+        max_dimension: int = 3000,
+        polling_interval: float = 1.0,
+        colorspace: str = "rgb"
     ) -> List[Dict[str, Any]]:
         """
         Robust strategy: Download PDF -> Render specific pages to Images -> Analyze Images.
         Bypasses Azure DI's PDF dimension limits (10,000px) and file size limits by controlling the input strictly.
+        Sync wrapper around analyze_via_rendering_async; from async code await that instead
+        (raises RuntimeError inside a running event loop).
+        """
+        return self._run_sync(self.analyze_via_rendering_async(
+            blob_url, local_file_path, page_range, dpi, max_dimension, polling_interval, colorspace
+        ))
+
+    async def analyze_via_rendering_async(
+        self, 
+        blob_url: str = None,
+        local_file_path: str = None,
+        page_range: str = None, 
+        dpi: int = 150, 
+        max_dimension: int = 3000,
+        polling_interval: float = 1.0,
+        colorspace: str = "rgb"
+    ) -> List[Dict[str, Any]]:
+        """
+        Async analyze_via_rendering: pages are rendered in the shared process pool (CPU-bound)
+        while up to RENDER_DI_CONCURRENCY page LROs poll concurrently.
         """
-        # DISABLED/DEPRECATED: We are focusing on URL-based analysis.
-        # Logic kept for reference but should not be called in main flow.
-        import requests
         import fitz
-        import io
-        import tempfile
-        import os
-        from PIL import Image
+        from azure.ai.documentintelligence.models import DocumentAnalysisFeature
 
         print(f"[AnalyzeViaRender] Starting robust analysis for {page_range}...")
         
         if not blob_url and not local_file_path:
             raise ValueError("Must provide either blob_url or local_file_path")
         
-        all_chunks = []
         tmp_path = None
         should_cleanup = False
         
@@ -377,62 +749,66 @@ class DocumentIntelligenceService:
                 should_cleanup = False
             else:
                 print(f"[AnalyzeViaRender] Downloading from Blob...")
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-                    tmp_path = tmp_file.name
-                    with requests.get(blob_url, stream=True) as r:
-                        r.raise_for_status()
-                        for chunk in r.iter_content(chunk_size=8192):
-                            tmp_file.write(chunk)
+                tmp_path = await self._download_pdf_async(blob_url)
                 should_cleanup = True
             
-            doc = fitz.open(tmp_path)
+            with fitz.open(tmp_path) as doc:
+                page_count = len(doc)
             
-            target_indices = []
-            if "-" in str(page_range):
-                start, end = map(int, str(page_range).split('-'))
-                target_indices = range(start - 1, end)
-            elif "," in str(page_range):
-                target_indices = [int(p) - 1 for p in str(page_range).split(',')]
-            else:
-                target_indices = [int(page_range) - 1]
+            target_indices = [p - 1 for p in _parse_page_range(page_range) if 0 < p <= page_count]
                 
             print(f"[AnalyzeViaRender] Rendering {len(target_indices)} pages...")
 
-            for p_idx in target_indices:
-                if p_idx < 0 or p_idx >= len(doc): continue
-                
-                page = doc.load_page(p_idx)
-                
-                rect = page.rect
-                scale = dpi / 72.0
-                if rect.width * scale > max_dimension or rect.height * scale > max_dimension:
-                    scale = min(max_dimension / rect.width, max_dimension / rect.height)
-                
-                mat = fitz.Matrix(scale, scale)
-                pix = page.get_pixmap(matrix=mat)
-                
-                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                img_bio = io.BytesIO()
-                img.save(img_bio, format="JPEG", quality=85)
-                img_bytes = img_bio.getvalue()
-                
-                print(f"[AnalyzeViaRender] Page {p_idx+1} rendered: {pix.width}x{pix.height}, {len(img_bytes)/1024:.1f}KB")
+            pool = _render_pool()
+            render_futures = []
+            semaphore = asyncio.Semaphore(self.RENDER_DI_CONCURRENCY)
+            features = [DocumentAnalysisFeature.BARCODES, DocumentAnalysisFeature.STYLE_FONT]
+
+            client = self._aio_client()
+
+            async def _analyze_page(p_idx):
+                # Renders run as fast as the pool allows; only the DI submission is bounded
+                future = pool.submit(_render_page_to_jpeg, (tmp_path, p_idx, dpi, max_dimension, self.RENDER_QUALITY, colorspace))
+                render_futures.append(future)
+                width, height, img_bytes = await asyncio.wrap_future(future)
+                print(f"[AnalyzeViaRender] Page {p_idx+1} rendered: {width}x{height}, {len(img_bytes)/1024:.1f}KB")
                 
-                # Use analyze_document with body for image bytes
-                poller = self.client.begin_analyze_document(
-                    "prebuilt-layout", 
-                    body=img_bytes,
-                    content_type="application/octet-stream",
-                    features=[DocumentAnalysisFeature.BARCODES, DocumentAnalysisFeature.STYLE_FONT]
-                )
-                result = poller.result()
+                async with semaphore:
+                    # Use analyze_document with body for image bytes
+                    poller = await client.begin_analyze_document(
+                        "prebuilt-layout", 
+                        body=img_bytes,
+                        content_type="application/octet-stream",
+                        features=features,
+                        # Every page is a fresh LRO; the 5s SDK default would dominate
+                        polling_interval=polling_interval
+                    )
+                    result = await poller.result()
                 
-                if result.pages:
-                    chunk = self._extract_page_content(result.pages[0], result)
-                    chunk["page_number"] = p_idx + 1
-                    all_chunks.append(chunk)
+                if not result.pages:
+                    return None
+                page = result.pages[0]
+                chunk = self._extract_page_content(page, self._group_tables_by_page(result).get(page.page_number, []))
+                chunk["page_number"] = p_idx + 1
+                return chunk
+
+            tasks = [asyncio.ensure_future(_analyze_page(p_idx)) for p_idx in target_indices]
+            try:
+                chunks = await asyncio.gather(*tasks)
+            except BaseException:
+                # One failed page must not leave its siblings submitting/polling paid DI jobs
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+            finally:
+                # The pool is shared and outlives this call: drop this call's queued renders and
+                # wait (off the loop) for running ones, which read tmp_path, before it is removed
+                for future in render_futures:
+                    future.cancel()
+                await asyncio.to_thread(wait_futures, render_futures)
 
-            return all_chunks
+            return [chunk for chunk in chunks if chunk is not None]
             
         except Exception as e:
             print(f"[AnalyzeViaRender] Failed: {e}")
@@ -441,7 +817,6 @@ class DocumentIntelligenceService:
             if should_cleanup and tmp_path and os.path.exists(tmp_path):
                 try: os.remove(tmp_path)
                 except: pass
-            if 'doc' in locals(): doc.close()
 
 # Singleton instance
 _doc_intel_service = None
@@ -452,3 +827,14 @@ def get_doc_intel_service() -> DocumentIntelligenceService:
     if _doc_intel_service is None:
         _doc_intel_service = DocumentIntelligenceService()
     return _doc_intel_service
+
+
+async def close_doc_intel_service():
+    """App shutdown: close the service's aio sessions and stop the render pool."""
+    global _render_pool_executor
+    if _doc_intel_service is not None:
+        await _doc_intel_service.aclose()
+    with _render_pool_lock:
+        pool, _render_pool_executor = _render_pool_executor, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -2,6 +2,7 @@ import time
 import asyncio
 import gc
 from app.services.azure_di import azure_di_service
+from app.core.json_utils import dumps
 from app.services.status_manager import status_manager
 from app.services.blob_storage import get_container_client, generate_sas_url
 from azure.storage.blob import generate_blob_sas, BlobSasPermissions
@@ -248,7 +249,7 @@ class RobustAnalysisManager:
 
                 def upload_page(page_data, page_num):
                     page_blob_name = f"{json_folder}/page_{page_num}.json"
-                    page_json = json.dumps(page_data, ensure_ascii=False)
+                    page_json = dumps(page_data)  # UTF-8 bytes via orjson when installed
                     page_client = container_client.get_blob_client(page_blob_name)
                     page_client.upload_blob(page_json, overwrite=True)
                     return page_num
@@ -281,7 +282,7 @@ class RobustAnalysisManager:
                 if username and '/temp/' in blob_name:
                     final_blob_name = f"{username}/{category}/{filename}"
                 print(f"[Chunk] Indexing {len(chunks)} pages for {page_range} (blob_path={final_blob_name})...", flush=True)
-                azure_search_service.index_documents(filename, category, chunks, blob_name=final_blob_name)
+                await azure_search_service.aindex_documents(filename, category, chunks, blob_name=final_blob_name)
             except Exception as e:
                 print(f"[Chunk] Indexing Warning for {page_range}: {e}", flush=True)
 
@@ -1,7 +1,7 @@
 
-import json
 import time
 from azure.core.exceptions import ResourceModifiedError
+from app.core.json_utils import dumps, loads
 from app.services.blob_storage import get_container_client
 
 
@@ -30,7 +30,7 @@ class StatusManager:
         props = blob_client.get_blob_properties()
         etag = props.etag
         data = blob_client.download_blob().readall()
-        return json.loads(data), etag
+        return loads(data), etag
 
     def _write_with_etag(self, blob_client, data, etag):
         """
@@ -38,7 +38,7 @@ class StatusManager:
         If etag is None (new blob), uses overwrite=True without condition.
         Raises ResourceModifiedError if blob was modified since read.
         """
-        payload = json.dumps(data)
+        payload = dumps(data)
         if etag:
             from azure.core import MatchConditions
             blob_client.upload_blob(
@@ -87,7 +87,7 @@ class StatusManager:
             "status": "in_progress",
             "last_updated": None
         }
-        blob_client.upload_blob(json.dumps(status_data), overwrite=True)
+        blob_client.upload_blob(dumps(status_data), overwrite=True)
         return status_data
 
     def get_status(self, filename, username=None):
@@ -98,11 +98,11 @@ class StatusManager:
                 fallback = self._get_blob_client(filename, username=None)
                 if fallback.exists():
                     data = fallback.download_blob().readall()
-                    return json.loads(data)
+                    return loads(data)
             return None
 
         data = blob_client.download_blob().readall()
-        return json.loads(data)
+        return loads(data)
 
     def update_chunk_progress(self, filename, chunk_range, username=None):
         def _mutate(status):
@@ -169,7 +169,7 @@ class StatusManager:
     def write_status_direct(self, filename, status_data, username=None):
         """Direct write for cases where the caller manages the full status dict (e.g., /start resume)."""
         blob_client = self._get_blob_client(filename, username)
-        blob_client.upload_blob(json.dumps(status_data), overwrite=True)
+        blob_client.upload_blob(dumps(status_data), overwrite=True)
 
 
 status_manager = StatusManager()